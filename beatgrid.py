@@ -0,0 +1,186 @@
+"""
+Beat grids of the soundtracks
+Tempo, beat positions, onset strength at every beat and the exact duration of each track,
+extracted offline (CPU only) into assets/sounds/beatgrid.json
+Pattern definitions can snap their timestamps to the grid with quantize(), the sound manager
+reads the soundtrack durations from it
+
+usage:
+    python beatgrid.py build [track ...]    analyse the soundtracks and write the grid
+    python beatgrid.py check                how far the enemy launch times are from the grid
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+from bisect import bisect_left
+from functools import lru_cache
+
+import numpy
+
+from envelopes import RATE, SOUNDS, TRACKS
+
+VERSION = 1
+BEATGRID = os.path.join(SOUNDS, 'beatgrid.json')
+MIN_BPM = 70
+MAX_BPM = 180
+LEVELS = {
+    'points': 'PointEnemy',
+    'lines': 'LineEnemy',
+    'triangles': 'TriangleEnemy',
+}
+
+
+def estimate_tempo(onset):
+    # beat period in envelope frames from the autocorrelation of the onset envelope,
+    # weighted towards 120 bpm so half / double tempo only wins when clearly stronger
+    o = onset - onset.mean()
+    n = len(o)
+    spectrum = numpy.fft.rfft(o, 2 * n)
+    correlation = numpy.fft.irfft(spectrum * numpy.conj(spectrum))[:n]
+    lags = numpy.arange(math.floor(60 * RATE / MAX_BPM), math.ceil(60 * RATE / MIN_BPM) + 1)
+    bpm = 60 * RATE / lags
+    weight = numpy.exp(-0.5 * (numpy.log2(bpm / 120) / 1.0) ** 2)
+    scores = correlation[lags] * weight
+    i = int(numpy.argmax(scores))
+    lag = float(lags[i])
+    if 0 < i < len(lags) - 1:
+        # parabolic interpolation for a fractional period
+        a, b, c = correlation[lags[i - 1]], correlation[lags[i]], correlation[lags[i + 1]]
+        if a - 2 * b + c != 0:
+            lag += 0.5 * (a - c) / (a - 2 * b + c)
+    return float(lag)
+
+
+def extract(onset, duration):
+    period = estimate_tempo(onset)
+    # phase with the most onset energy on the grid
+    best, offset = -1.0, 0.0
+    for phase in numpy.arange(0, period, 0.5):
+        index = numpy.round(numpy.arange(phase, len(onset) - 0.5, period)).astype(int)
+        score = onset[index].sum()
+        if score > best:
+            best, offset = score, phase
+    beats = numpy.arange(offset, min(len(onset), duration * RATE), period)
+    index = numpy.round(beats).astype(int)
+    # strength, the strongest onset within 20ms of the beat
+    strength = numpy.max([onset[numpy.clip(index + d, 0, len(onset) - 1)] for d in (-2, -1, 0, 1, 2)], axis=0)
+    return {
+        'duration': round(duration, 4),
+        'tempo': round(float(60 * RATE / period), 3),
+        'offset': round(float(offset / RATE), 4),
+        'beats': [round(i / RATE, 4) for i in beats.tolist()],
+        'strength': [round(i, 3) for i in strength.tolist()],
+    }
+
+
+class BeatGrid:
+    """
+    Beat positions of one soundtrack
+    """
+
+    def __init__(self, data: dict):
+        self.duration = data['duration']
+        self.tempo = data['tempo']
+        self.offset = data['offset']
+        self.beats = data['beats']
+        self.strength = data['strength']
+
+    @property
+    def period(self):
+        return 60 / self.tempo
+
+    def quantize(self, _time, division=1):
+        # nearest beat (or 1 / division of a beat) to _time
+        step = self.period / division
+        return round(self.offset + round((_time - self.offset) / step) * step, 4)
+
+    def beat_times(self, start, count, every=1.0):
+        # count beats from the first one at or after start, every -> beats between them
+        first = self.quantize(start)
+        if first < start - 1e-6:
+            first += self.period
+        return [round(first + i * every * self.period, 4) for i in range(count)]
+
+    def beat_index(self, _time):
+        return bisect_left(self.beats, _time)
+
+
+@lru_cache()
+def load_beatgrids():
+    if not os.path.exists(BEATGRID):
+        return {}
+    try:
+        with open(BEATGRID) as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f'could not read beat grid {BEATGRID}: {e}')
+        return {}
+    if data.get('version') != VERSION:
+        return {}
+    return {name: BeatGrid(track) for name, track in data.get('tracks', {}).items()}
+
+
+def load_beatgrid(track):
+    return load_beatgrids().get(track)
+
+
+def quantize(track, _time, division=1):
+    # for pattern definitions, leaves _time alone when there is no grid for the track
+    grid = load_beatgrid(track)
+    return grid.quantize(_time, division) if grid else _time
+
+
+def track_duration(track):
+    grid = load_beatgrid(track)
+    return grid.duration if grid else None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='extract the soundtrack beat grids')
+    parser.add_argument('command', choices=('build', 'check'))
+    parser.add_argument('tracks', nargs='*', default=list(TRACKS))
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        import pygame
+
+        from envelopes import analyse, decode
+
+        pygame.mixer.init(frequency=44100, size=-16, channels=2)
+        data = {'version': VERSION, 'rate': RATE, 'tracks': {}}
+        if os.path.exists(BEATGRID):
+            with open(BEATGRID) as f:
+                data['tracks'] = json.load(f).get('tracks', {})
+        for track in args.tracks:
+            samples, frequency = decode(track)
+            onset = analyse(samples, frequency)[:, 1]
+            data['tracks'][track] = extract(onset, len(samples) / frequency)
+            grid = data['tracks'][track]
+            print(f'{track}: {grid["duration"]:.2f}s, {grid["tempo"]:.1f} bpm, '
+                  f'first beat {grid["offset"]:.2f}s, {len(grid["beats"])} beats')
+        with open(BEATGRID, 'w') as f:
+            json.dump(data, f, indent=1)
+        load_beatgrids.cache_clear()
+        return 0
+
+    import objects
+
+    for track in args.tracks:
+        grid = load_beatgrid(track)
+        if grid is None:
+            print(f'{track}: no beat grid, run python beatgrid.py build')
+            continue
+        times = sorted({i[0] for i in getattr(objects, LEVELS[track]).get_launching_patterns()})
+        for division in (1, 2, 4):
+            off = numpy.array([abs(t - grid.quantize(t, division)) for t in times])
+            print(f'{track} 1/{division} beat: launch times off grid by mean {off.mean() * 1000:.0f}ms, '
+                  f'max {off.max() * 1000:.0f}ms, {(off < 0.02).mean():.0%} within 20ms')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""
+Micro benchmarks of the game objects, runs without a window
+clip_segments below is a vectorized Rect.clipline kept only as a benchmark and reference,
+no game code uses it: one clipline per segment is faster at the segment counts the game has
+
+usage:
+    python bench.py objects [--count 20000] [--frames 3600]    bytes per bullet and gc pauses while spawning
+    python bench.py clip [--seed 0]                             clip_segments against one Rect.clipline per segment
+    python bench.py triangles [--repeat 200]                    triangle geometry at the triangle level's peak
+"""
+
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+from collections import deque
+from time import perf_counter
+
+import numpy
+
+TOP, BOTTOM, LEFT, RIGHT = 1, 2, 4, 8
+
+
+def bullet_types():
+    import objects
+
+    return {
+        'PointBullet': lambda i: objects.PointBullet(400, 300, 1, 0),
+        'LineBullet': lambda i: objects.LineBullet(400, 300, 1, 0),
+        'LineBullet1': lambda i: objects.LineBullet1(400, 300, 3, 0, speed=3),
+        'TriangleBullet1': lambda i: objects.TriangleBullet1(400, 300, 3, 0, length=10, speed=3),
+    }
+
+
+def bytes_per_object(factory, count):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [factory(i) for i in range(count)]
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del kept
+    # minus the list holding them
+    return used / count - 8
+
+
+class GCTimer:
+    """
+    Collects the duration of every garbage collection through gc.callbacks
+    """
+
+    def __init__(self):
+        self.pauses = []
+        self.start = 0.0
+
+    def __call__(self, phase, info):
+        if phase == 'start':
+            self.start = perf_counter()
+        else:
+            self.pauses.append(perf_counter() - self.start)
+
+    def __enter__(self):
+        gc.collect()
+        gc.callbacks.append(self)
+        return self
+
+    def __exit__(self, *args):
+        gc.callbacks.remove(self)
+
+
+def full_collection(factory, count):
+    # one full collection with count bullets alive, what a gen 2 pass costs at peak
+    kept = [factory(i) for i in range(count)]
+    with GCTimer() as timer:
+        gc.collect()
+    del kept
+    return timer.pauses[0]
+
+
+def gc_pauses(factory, frames, per_frame, lifetime):
+    # every frame spawns per_frame bullets that live for lifetime frames, like a dense pattern
+    alive = deque()
+    with GCTimer() as timer:
+        for frame in range(frames):
+            alive.append([factory(i) for i in range(per_frame)])
+            if len(alive) > lifetime:
+                alive.popleft()
+    return timer.pauses
+
+
+def bench_objects(args):
+    for name, factory in bullet_types().items():
+        size = bytes_per_object(factory, args.count)
+        full = full_collection(factory, args.count)
+        pauses = gc_pauses(factory, args.frames, args.per_frame, args.lifetime)
+        total = sum(pauses) * 1000
+        print(f'{name}: {size:.0f} bytes, full collection {full * 1000:.2f} ms with {args.count} alive, '
+              f'{len(pauses)} collections while spawning, {total:.1f} ms total, max pause {max(pauses, default=0) * 1000:.2f} ms')
+
+
+def _outcodes(x, y, left, top, right, bottom):
+    code = numpy.where(y < top, TOP, numpy.where(y > bottom, BOTTOM, 0))
+    return code | numpy.where(x < left, LEFT, numpy.where(x > right, RIGHT, 0))
+
+
+def _div(a, b):
+    # C integer division, truncating towards zero
+    q = a // b
+    return numpy.where((q < 0) & (q * b != a), q + 1, q)
+
+
+def clip_segments(segments, rect):
+    """
+    Which of the segments (n x 4 array of x1, y1, x2, y2) touch rect, exactly as Rect.clipline would answer
+    for each of them: endpoints truncated to ints and SDL's integer Cohen-Sutherland on the inclusive rect
+    """
+    segments = numpy.asarray(segments, dtype=numpy.float64).reshape(-1, 4)
+    x1, y1, x2, y2 = numpy.trunc(segments).astype(numpy.int64).T.copy()
+    left, top, w, h = rect
+    # clipline flips negative sizes like Rect.normalize, only zero sized rects are empty
+    if w < 0:
+        left, w = left + w, -w
+    if h < 0:
+        top, h = top + h, -h
+    if w == 0 or h == 0:
+        return numpy.zeros(len(segments), dtype=bool)
+    right = left + w - 1
+    bottom = top + h - 1
+
+    inside = (x1 >= left) & (x1 <= right) & (x2 >= left) & (x2 <= right) & \
+             (y1 >= top) & (y1 <= bottom) & (y2 >= top) & (y2 <= bottom)
+    outside = ((x1 < left) & (x2 < left)) | ((x1 > right) & (x2 > right)) | \
+              ((y1 < top) & (y2 < top)) | ((y1 > bottom) & (y2 > bottom))
+    # horizontal and vertical lines on the rect's side of all four edges always cross it
+    hit = inside | (~outside & ((y1 == y2) | (x1 == x2)))
+    # only the few segments left need clipping, the rest of the work is done on them alone
+    rest = numpy.flatnonzero(~outside & ~hit)
+    if len(rest):
+        hit[rest] = _clip(x1[rest], y1[rest], x2[rest], y2[rest], left, top, right, bottom)
+    return hit
+
+
+def _clip(x1, y1, x2, y2, left, top, right, bottom):
+    hit = numpy.zeros(len(x1), dtype=bool)
+    active = numpy.ones(len(x1), dtype=bool)
+    code1 = _outcodes(x1, y1, left, top, right, bottom)
+    code2 = _outcodes(x2, y2, left, top, right, bottom)
+    while active.any():
+        # segments that are done, either both ends inside or both beyond the same edge
+        hit |= active & (code1 == 0) & (code2 == 0)
+        active &= (code1 | code2) != 0
+        active &= (code1 & code2) == 0
+        if not active.any():
+            break
+        # clip the first end while it is outside, then the second one, one edge per pass
+        first = code1 != 0
+        code = numpy.where(first, code1, code2)
+        px = numpy.where(first, x1, x2)
+        py = numpy.where(first, y1, y2)
+        vertical = (code & (TOP | BOTTOM)) != 0
+        ey = numpy.where(code & TOP, top, bottom)
+        ex = numpy.where(code & LEFT, left, right)
+        dx = x2 - x1
+        dy = y2 - y1
+        # both axes are computed for every segment, zero divisors only occur on the axis not used
+        x = numpy.where(vertical, x1 + _div(dx * (ey - y1), numpy.where(dy == 0, 1, dy)), ex)
+        y = numpy.where(vertical, ey, y1 + _div(dy * (ex - x1), numpy.where(dx == 0, 1, dx)))
+        x = numpy.where(active, x, px)
+        y = numpy.where(active, y, py)
+        code = _outcodes(x, y, left, top, right, bottom)
+        update1 = active & first
+        update2 = active & ~first
+        x1 = numpy.where(update1, x, x1)
+        y1 = numpy.where(update1, y, y1)
+        code1 = numpy.where(update1, code, code1)
+        x2 = numpy.where(update2, x, x2)
+        y2 = numpy.where(update2, y, y2)
+        code2 = numpy.where(update2, code, code2)
+    return hit
+
+
+def bench_clip(args):
+    # tests/test_clip_segments.py checks that both give the same answers, this only times them
+    import pygame
+
+    rng = numpy.random.default_rng(args.seed)
+    rect = pygame.Rect(392, 292, 15, 15)  # the player
+    for n in (8, 64, 512, 4096, 32768):
+        segments = rng.uniform(0, 800, (n, 4))
+        listed = segments.tolist()
+        repeat = max(3, 20000 // n)
+        start = perf_counter()
+        for _ in range(repeat):
+            [rect.clipline(*i) for i in listed]
+        clipline = (perf_counter() - start) / repeat
+        start = perf_counter()
+        for _ in range(repeat):
+            clip_segments(listed, rect)
+        kernel = (perf_counter() - start) / repeat
+        print(f'{n} segments: clipline {clipline * 1e6:.0f} us, clip_segments {kernel * 1e6:.0f} us')
+
+
+def vector_triangle(length, pos, angle):
+    # get_triangle before the triangle table, rotating Vector2s on every call
+    import pygame
+
+    pos = pygame.Vector2(pos)
+    point_a = pygame.Vector2(0, -length)
+    points = [point_a, point_a.rotate(120), point_a.rotate(240)]
+    for i in points:
+        i.rotate_ip(angle)
+        i += pos
+    return points
+
+
+def triangle_peak():
+    # the triangle bullets alive at the busiest frame of the triangle level, played without collisions
+    import random
+
+    import main as game
+    from config import Globals
+    from constants import CHECKPOINT, FIRST_TIME_PLAYED
+    from headless import SimulatedClock
+    from objects import TriangleBullet1
+    from utils import game_clock
+
+    random.seed(0)
+    clock = SimulatedClock()
+    game_clock.set_source(clock)
+    try:
+        g = game.Game()
+        manager = g.manager
+        Globals.set(FIRST_TIME_PLAYED, True)
+        Globals.set(CHECKPOINT, 0)
+        manager.switch_mode('triangle')
+        manager.object_manager.collision_enabled = False
+        peak = []
+        while manager.mode == 'triangle' and manager.to_switch == 'none':
+            g.update([])
+            clock.advance(1 / 60)
+            bullets = [i for i in manager.object_manager.objects if isinstance(i, TriangleBullet1) and i.alive]
+            if len(bullets) > len(peak):
+                peak = bullets
+    finally:
+        game_clock.set_source()
+    return peak
+
+
+def bench_triangles(args):
+    import types
+
+    import pygame
+
+    bullets = triangle_peak()
+    print(f'{len(bullets)} triangle bullets at the peak of the triangle level')
+    # a player on every bullet, so each check goes through all three edges or hits
+    players = [types.SimpleNamespace(rect=pygame.Rect(int(i.x) - 7, int(i.y) - 7, 15, 15)) for i in bullets]
+
+    def vector_collision(bullet, player):
+        points = vector_triangle(bullet.length, bullet.pos, bullet.angle)
+        return any(player.rect.clipline(points[i], points[(i + 1) % 3]) for i in range(3))
+
+    error = max(max(abs(a[0] - b[0]), abs(a[1] - b[1]))
+                for i in bullets for a, b in zip(i.points, vector_triangle(i.length, i.pos, i.angle)))
+    disagree = sum(vector_collision(i, p) != i.check_collision(p) for i, p in zip(bullets, players))
+    print(f'cached shapes: max vertex error {error:.4f} px, {disagree} of {len(bullets)} collisions differ')
+
+    cases = {
+        'points': (lambda: [vector_triangle(i.length, i.pos, i.angle) for i in bullets],
+                   lambda: [i.points for i in bullets]),
+        'collisions': (lambda: [vector_collision(i, p) for i, p in zip(bullets, players)],
+                       lambda: [i.check_collision(p) for i, p in zip(bullets, players)]),
+    }
+    for name, (vector, cached) in cases.items():
+        timings = []
+        for run in (vector, cached):
+            start = perf_counter()
+            for _ in range(args.repeat):
+                run()
+            timings.append((perf_counter() - start) / args.repeat)
+        print(f'{name} per frame: Vector2 {timings[0] * 1e6:.0f} us, cached {timings[1] * 1e6:.0f} us '
+              f'({timings[0] / timings[1]:.1f}x)')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='micro benchmarks of the game objects')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('objects', help='bytes per bullet and gc pauses')
+    p.add_argument('--count', type=int, default=20000, help='bullets kept alive for the size measurement')
+    p.add_argument('--frames', type=int, default=3600)
+    p.add_argument('--per-frame', type=int, default=12, help='bullets spawned every frame')
+    p.add_argument('--lifetime', type=int, default=120, help='frames a bullet lives')
+    p = sub.add_parser('clip', help='clip_segments against Rect.clipline')
+    p.add_argument('--seed', type=int, default=0)
+    p = sub.add_parser('triangles', help='triangle geometry at the triangle level\'s peak')
+    p.add_argument('--repeat', type=int, default=200, help='timed frames')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    if args.command == 'objects':
+        bench_objects(args)
+    elif args.command == 'clip':
+        bench_clip(args)
+    elif args.command == 'triangles':
+        bench_triangles(args)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,69 @@
+from math import floor
+
+
+class SpatialHash:
+    """
+    Uniform grid broad phase for collision checks
+    Objects are bucketed by their bounding box every frame and only the ones
+    sharing a cell with the query box go through the narrow phase
+    """
+
+    def __init__(self, cell_size=64, max_cells=24):
+        self.cell_size = cell_size
+        self.max_cells = max_cells  # objects covering more cells are always tested
+        self.cells: dict[tuple[int, int], list] = {}
+        self.oversized = []
+        self.unbounded = []
+        # counters for the last built frame
+        self.total_objects = 0
+        self.candidates_tested = 0
+
+    def clear(self):
+        self.cells.clear()
+        self.oversized.clear()
+        self.unbounded.clear()
+        self.total_objects = 0
+        self.candidates_tested = 0
+
+    def cell_range(self, bounds):
+        left, top, right, bottom = bounds
+        size = self.cell_size
+        return floor(left / size), floor(top / size), floor(right / size), floor(bottom / size)
+
+    def insert(self, _object, bounds=None):
+        self.total_objects += 1
+        if bounds is None:
+            self.unbounded.append(_object)
+            return
+        x1, y1, x2, y2 = self.cell_range(bounds)
+        if (x2 - x1 + 1) * (y2 - y1 + 1) > self.max_cells:
+            self.oversized.append(_object)
+            return
+        cells = self.cells
+        for cx in range(x1, x2 + 1):
+            for cy in range(y1, y2 + 1):
+                try:
+                    cells[cx, cy].append(_object)
+                except KeyError:
+                    cells[cx, cy] = [_object]
+
+    def build(self, objects):
+        self.clear()
+        for i in objects:
+            self.insert(i, i.get_bounds())
+
+    def query(self, bounds):
+        # unique objects that may overlap bounds, in no particular order
+        candidates = {}
+        for i in self.unbounded:
+            candidates[id(i)] = i
+        for i in self.oversized:
+            candidates[id(i)] = i
+        x1, y1, x2, y2 = self.cell_range(bounds)
+        cells = self.cells
+        for cx in range(x1, x2 + 1):
+            for cy in range(y1, y2 + 1):
+                for i in cells.get((cx, cy), ()):
+                    candidates[id(i)] = i
+        self.candidates_tested = len(candidates)
+        return candidates.values()
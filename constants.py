@@ -8,6 +8,8 @@ UPCOMING_LEVEL = 'upcoming-level'
 
 CHECKPOINT = 0  # time
 MUSIC_INIT = 'music-init'
-SOUND_VALUE = 'sound-value'
+SOUND_VALUE = 'sound-value'  # soundtrack loudness 0 - 10
+SOUND_ONSET = 'sound-onset'  # 0 - 1
+SOUND_BEAT = 'sound-beat'  # 1 on a beat, decaying towards 0 after it
 ELAPSED_TIME_FOR_SOUNDTRACK = 'sound-track-elapsed-time'
 TOTAL_DURATION_OF_SOUNDTRACK = 'total-duration-of-soundtrack'
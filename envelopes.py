@@ -0,0 +1,163 @@
+"""
+Precomputed soundtrack envelopes for audio reactive effects
+Each soundtrack is decoded once offline into per frame loudness (rms), onset strength and beat pulse,
+saved as a small .npy next to the track and memory mapped at runtime for O(1) lookups by soundtrack time
+
+usage:
+    python envelopes.py build [track ...]    decode the soundtracks and write the envelopes
+    python envelopes.py info [track ...]     show what is stored
+"""
+
+import argparse
+import os
+import sys
+from functools import lru_cache
+
+import numpy
+
+from config import ASSETS
+
+SOUNDS = os.path.join(ASSETS, 'sounds')
+TRACKS = ('points', 'lines', 'triangles')
+RATE = 100  # envelope frames per second of soundtrack
+COLUMNS = ('rms', 'onset', 'beat')  # all normalized to 0 - 1
+WINDOW = 2048  # samples per spectrum for the onset envelope
+BEAT_DECAY = 0.15  # seconds for a beat pulse to fall to 1 / e
+
+
+def envelope_path(track):
+    return os.path.join(SOUNDS, f'{track}.envelope.npy')
+
+
+def decode(track):
+    # mono float32 samples and the sample rate, needs an initialised mixer
+    import pygame
+
+    sound = pygame.mixer.Sound(os.path.join(SOUNDS, f'{track}.ogg'))
+    frequency, _, channels = pygame.mixer.get_init()
+    samples = pygame.sndarray.array(sound).astype(numpy.float32) / 32768
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    return samples, frequency
+
+
+def analyse(samples, frequency):
+    hop = frequency // RATE
+    frames = len(samples) // hop
+    framed = samples[:frames * hop].reshape(frames, hop)
+    rms = numpy.sqrt((framed ** 2).mean(axis=1))
+
+    # spectral flux, summed positive change of the log magnitude spectrum between frames
+    padded = numpy.concatenate([numpy.zeros(WINDOW // 2, numpy.float32), samples, numpy.zeros(WINDOW, numpy.float32)])
+    window = numpy.hanning(WINDOW).astype(numpy.float32)
+    onset = numpy.zeros(frames, numpy.float32)
+    previous = None
+    for start in range(0, frames, 1024):
+        # chunked, the full frame x spectrum matrix of a track does not need to be in memory
+        index = numpy.arange(start, min(start + 1024, frames))[:, None] * hop + numpy.arange(WINDOW)
+        spectrum = numpy.log1p(numpy.abs(numpy.fft.rfft(padded[index] * window, axis=1)))
+        if previous is None:
+            previous = spectrum[:1]
+        flux = numpy.diff(numpy.concatenate([previous, spectrum]), axis=0)
+        onset[start:start + len(spectrum)] = numpy.maximum(flux, 0).sum(axis=1)
+        previous = spectrum[-1:]
+
+    # beats, onset peaks well above their surroundings at least 0.25s apart, rendered as decaying pulses
+    width = RATE // 2
+    kernel = numpy.ones(width) / width
+    average = numpy.convolve(onset, kernel, mode='same')
+    deviation = numpy.sqrt(numpy.convolve((onset - average) ** 2, kernel, mode='same'))
+    peaks = (onset > average + deviation * 1.25) & (onset >= numpy.roll(onset, 1)) & (onset >= numpy.roll(onset, -1))
+    beat = numpy.zeros(frames, numpy.float32)
+    decay = numpy.float32(numpy.exp(-1 / (BEAT_DECAY * RATE)))
+    last = -RATE
+    level = 0.0
+    for i in range(frames):
+        level *= decay
+        if peaks[i] and i - last >= RATE // 4:
+            level = 1.0
+            last = i
+        beat[i] = level
+
+    def normalize(values, top):
+        top = top or 1.0
+        return numpy.clip(values / top, 0, 1)
+
+    return numpy.stack([
+        normalize(rms, rms.max()),
+        normalize(onset, numpy.percentile(onset, 99)),
+        beat,
+    ], axis=1).astype(numpy.float32)
+
+
+class Envelope:
+    """
+    Memory mapped envelope of one soundtrack
+    """
+
+    def __init__(self, data: numpy.ndarray):
+        self.data = data
+
+    @property
+    def duration(self):
+        return len(self.data) / RATE
+
+    def __len__(self):
+        return len(self.data)
+
+    def at(self, _time):
+        # rms, onset, beat at soundtrack time _time
+        if _time is None or _time < 0 or not len(self.data):
+            return 0.0, 0.0, 0.0
+        row = self.data[min(int(_time * RATE), len(self.data) - 1)]
+        return float(row[0]), float(row[1]), float(row[2])
+
+
+@lru_cache()
+def load_envelope(track):
+    path = envelope_path(track)
+    if not os.path.exists(path):
+        return None
+    try:
+        data = numpy.load(path, mmap_mode='r', allow_pickle=False)
+    except (OSError, ValueError) as e:
+        print(f'could not read envelope {path}: {e}')
+        return None
+    if data.ndim != 2 or data.shape[1] != len(COLUMNS):
+        return None
+    return Envelope(data)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='precompute the soundtrack envelopes')
+    parser.add_argument('command', choices=('build', 'info'))
+    parser.add_argument('tracks', nargs='*', default=list(TRACKS))
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+        import pygame
+
+        pygame.mixer.init(frequency=44100, size=-16, channels=2)
+        for track in args.tracks:
+            samples, frequency = decode(track)
+            data = analyse(samples, frequency)
+            numpy.save(envelope_path(track), data)
+            print(f'{track}: {len(data) / RATE:.1f}s, {len(data)} frames -> {envelope_path(track)}')
+        return 0
+
+    failed = False
+    for track in args.tracks:
+        envelope = load_envelope(track)
+        if envelope is None:
+            print(f'{track}: missing or unreadable {envelope_path(track)}')
+            failed = True
+            continue
+        means = ', '.join(f'{name} {envelope.data[:, i].mean():.3f}' for i, name in enumerate(COLUMNS))
+        beats = int(((envelope.data[1:, 2] == 1) & (envelope.data[:-1, 2] < 1)).sum())
+        print(f'{track}: {envelope.duration:.1f}s, {len(envelope)} frames, {beats} beats, mean {means}')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,108 @@
+"""
+Glyph atlas for the game font
+Each (size, color, aliasing, character) is rendered once, strings are drawn by blitting their glyphs
+with one Surface.blits call, so typed subtitles and menu labels no longer render a surface per string
+"""
+
+import pygame
+
+from utils import font
+
+SPACE = '   '  # the game font's space is narrow, text() has always drawn three of them
+
+
+class GlyphAtlas:
+    """
+    Cache of single character surfaces and their advances
+    draw() blits a string at a rect anchor, size() / rect() measure it without rendering anything
+    """
+
+    def __init__(self):
+        self.glyphs: dict[tuple, pygame.Surface] = {}
+        self.metrics: dict[tuple[int, str], tuple[int, int, int]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self.glyphs.clear()
+        self.metrics.clear()
+
+    def metric(self, size, char):
+        # (advance, left, right) of char, left / right -> extent of its rendered surface around the pen
+        try:
+            return self.metrics[size, char]
+        except KeyError:
+            f = font(size)
+            metrics = f.metrics(char)[0]
+            if metrics is None:
+                width = f.size(char)[0]
+                metric = (width, 0, width)
+            else:
+                minx, maxx, _, _, advance = metrics
+                metric = (advance, min(0, minx), max(advance, maxx))
+            self.metrics[size, char] = metric
+            return metric
+
+    def layout(self, msg, size):
+        # pen position of every character and the extent of the whole string, as font.render lays it out
+        pens = []
+        pen = left = right = 0
+        for i in msg.replace(' ', SPACE):
+            advance, l, r = self.metric(size, i)
+            pens.append((i, pen + l))
+            left = min(left, pen + l)
+            right = max(right, pen + r)
+            pen += advance
+        return pens, left, right
+
+    def glyph(self, char, size, color, aliased=False):
+        key = (size, color, aliased, char)
+        try:
+            glyph = self.glyphs[key]
+        except KeyError:
+            self.misses += 1
+            glyph = self.glyphs[key] = font(size).render(char, aliased, color)
+            return glyph
+        self.hits += 1
+        return glyph
+
+    def size(self, msg: str, size=50):
+        _, left, right = self.layout(msg, size)
+        return right - left, font(size).get_height()
+
+    def rect(self, msg: str, size=50, **anchor):
+        # e.g. rect('Retry ?', center=(x, y)), like Surface.get_rect
+        rect = pygame.Rect((0, 0), self.size(msg, size))
+        for name, value in anchor.items():
+            setattr(rect, name, value)
+        return rect
+
+    def draw(self, surf: pygame.Surface, msg: str, size=50, color=(255, 255, 255), aliased=False, **anchor):
+        # draws msg at the anchor (default topleft=(0, 0)) and returns its rect
+        pens, left, right = self.layout(msg, size)
+        rect = pygame.Rect(0, 0, right - left, font(size).get_height())
+        for name, value in anchor.items():
+            setattr(rect, name, value)
+        x = rect.x - left
+        y = rect.y
+        surf.blits([(self.glyph(i, size, color, aliased), (x + pen, y)) for i, pen in pens if i != ' '], False)
+        return rect
+
+    def render(self, msg: str, size=50, color=(255, 255, 255), aliased=False):
+        # a standalone surface of msg, for callers that keep it around
+        surf = pygame.Surface(self.size(msg, size), pygame.SRCALPHA)
+        self.draw(surf, msg, size, color, aliased)
+        return surf
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'glyphs': len(self.glyphs),
+            'bytes': sum(i.get_width() * i.get_height() * i.get_bytesize() for i in self.glyphs.values()),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+glyph_atlas = GlyphAtlas()
@@ -0,0 +1,183 @@
+"""
+Headless, deterministic level runner
+Runs a level without a window or audio device on a simulated clock stepped at a fixed rate,
+so a run takes as long as the machine needs instead of the length of the soundtrack
+Player input comes from a recording made with python main.py --record take.json (see replay.py)
+
+usage:
+    python headless.py point [--input take.json] [--god] [--checkpoint 35] [--csv frames.csv]
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import time
+
+LEVELS = ('point', 'line', 'triangle')
+
+
+class SimulatedClock:
+    """
+    Source for utils.game_clock, only moves when advanced
+    """
+
+    def __init__(self, start=0.0):
+        self.time = start
+
+    def __call__(self):
+        return self.time
+
+    def advance(self, dt):
+        self.time += dt
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, round(p / 100 * (len(values) - 1)))]
+
+
+def run_level(level, script=None, fps=60, seconds=None, checkpoint=None, god=False, seed=0, draw=True, profile=None):
+    """Plays a level to its end (or the player's death) and returns the per frame timings"""
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+    # the game modules initialise pygame on import, so they are imported after the SDL drivers are set
+    import main as game
+    from config import Globals
+    from pools import gc_guard
+    from constants import CHECKPOINT, ELAPSED_TIME_FOR_SOUNDTRACK, FIRST_TIME_PLAYED, TOTAL_DURATION_OF_SOUNDTRACK
+    from profiler import profiler
+    from replay import InputScript
+    from utils import game_clock, set_key_state
+
+    random.seed(seed)
+    clock = SimulatedClock()
+    game_clock.set_source(clock)
+    script = script or InputScript([], level)
+    set_key_state(script.keys)
+    if profile:
+        profiler.record(profile)
+    try:
+        g = game.Game()
+        manager = g.manager
+        Globals.set(FIRST_TIME_PLAYED, True)
+        Globals.set(CHECKPOINT, script.checkpoint if checkpoint is None else checkpoint)
+        manager.switch_mode(level)
+        if god:
+            manager.object_manager.collision_enabled = False
+        dt = 1 / fps
+        limit = seconds if seconds is not None else manager.sound_manager.total_length + 5
+        frames = []
+        outcome = 'timeout'
+        started = time.perf_counter()
+        while True:
+            soundtrack_time = Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK) or 0.0
+            events = script.events(soundtrack_time)
+            profiler.begin_frame()
+            t0 = time.perf_counter()
+            g.update(events)
+            t1 = time.perf_counter()
+            if draw:
+                g.draw()
+            t2 = time.perf_counter()
+            om = manager.object_manager
+            profiler.end_frame(om, manager.mode, soundtrack_time)
+            frames.append((soundtrack_time, t1 - t0, t2 - t1, len(om.objects) + len(om.point_bullets)))
+            clock.advance(dt)
+            if manager.to_switch != 'none' or manager.mode != level:
+                outcome = 'died' if manager.to_switch == 'retry' else 'finished'
+                break
+            if soundtrack_time > limit:
+                break
+        wall = time.perf_counter() - started
+        duration = Globals.get(TOTAL_DURATION_OF_SOUNDTRACK)
+        sound = manager.sound_manager.stats()
+        audio_sync = manager.sound_manager.sync.stats()
+    finally:
+        gc_guard.exit()
+        game_clock.set_source()
+        set_key_state()
+    return {
+        'level': level,
+        'outcome': outcome,
+        'soundtrack_time': frames[-1][0] if frames else 0.0,
+        'duration': duration,
+        'frames': frames,
+        'wall': wall,
+        'simulated': len(frames) * dt,
+        'sound': sound,
+        'audio_sync': audio_sync,
+    }
+
+
+def report(result):
+    frames = result['frames']
+    update = [i[1] * 1000 for i in frames]
+    draw = [i[2] * 1000 for i in frames]
+    print(f'{result["level"]}: {result["outcome"]} at {result["soundtrack_time"]:.2f}s of {result["duration"]}s')
+    print(f'frames: {len(frames)}, simulated {result["simulated"]:.1f}s in {result["wall"]:.1f}s '
+          f'({result["simulated"] / max(result["wall"], 1e-9):.1f}x realtime)')
+    for name, values in (('update', update), ('draw', draw)):
+        print(f'{name}: mean {sum(values) / max(len(values), 1):.3f} ms, '
+              f'p95 {percentile(values, 95):.3f} ms, max {max(values, default=0):.3f} ms')
+    print(f'peak objects: {max((i[3] for i in frames), default=0)}')
+    from sprites import sprite_cache
+    stats = sprite_cache.stats()
+    print(f'sprite cache: {stats["size"]} sprites, {stats["hits"]} hits, {stats["misses"]} misses, '
+          f'{stats["evictions"]} evictions ({stats["hit_rate"]:.1%} hit rate)')
+    from pools import gc_guard, object_pool
+    stats = object_pool.stats()
+    print(f'object pool: {stats["allocated"]} allocated, {stats["recycled"]} recycled '
+          f'({stats["reuse_rate"]:.1%} reused), {stats["free"]} free')
+    stats = gc_guard.stats()
+    print(f'gc during level: {stats["collections"]} collections, {stats["total"] * 1000:.1f} ms total, '
+          f'max pause {stats["max_pause"] * 1000:.2f} ms')
+    stats = result['sound']
+    print(f'sound effects: {stats["played"]} played, {stats["dropped"]} dropped, {stats["stolen"]} stolen, '
+          f'{stats["cache_hits"]} cache hits, {stats["decode_time_saved"] * 1000:.1f} ms of decoding saved')
+    stats = result['audio_sync']
+    print(f'audio sync: {stats["samples"]} samples, error mean {stats["error_mean"] * 1000:.1f} ms, '
+          f'max {stats["error_max"] * 1000:.1f} ms, drift {stats["drift"] * 1000:+.2f} ms/s, {stats["resyncs"]} resyncs')
+    from glyphs import glyph_atlas
+    stats = glyph_atlas.stats()
+    print(f'glyph atlas: {stats["glyphs"]} glyphs, {stats["bytes"] / 1024:.0f} KiB, {stats["hits"]} hits, '
+          f'{stats["misses"]} misses ({stats["hit_rate"]:.1%} hit rate)')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='run a level headless on a simulated clock')
+    parser.add_argument('level', nargs='?', choices=LEVELS)
+    parser.add_argument('--input', help='recorded input from main.py --record')
+    parser.add_argument('--fps', type=int, default=60)
+    parser.add_argument('--seconds', type=float, help='stop after this much soundtrack time')
+    parser.add_argument('--checkpoint', type=float, help='soundtrack time to start at')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--god', action='store_true', help='disable collisions so the level always plays through')
+    parser.add_argument('--no-draw', action='store_true', help='skip rendering')
+    parser.add_argument('--csv', help='write per frame timings to this file')
+    parser.add_argument('--profile', help='write per subsystem timings to this .csv or .json file')
+    args = parser.parse_args(argv)
+
+    from replay import InputScript
+
+    script = InputScript.load(args.input) if args.input else None
+    level = args.level or (script.level if script else None)
+    if level is None:
+        parser.error('a level or an --input recording is needed')
+    result = run_level(level, script, args.fps, args.seconds, args.checkpoint, args.god, args.seed, not args.no_draw, args.profile)
+    report(result)
+    if args.csv:
+        with open(args.csv, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['soundtrack_time', 'update_ms', 'draw_ms', 'objects'])
+            for t, update, draw, count in result['frames']:
+                writer.writerow([f'{t:.4f}', f'{update * 1000:.4f}', f'{draw * 1000:.4f}', count])
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
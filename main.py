@@ -5,6 +5,8 @@ import pygame
 from config import *
 from constants import *
 from menu import MenuManager
+from profiler import profiler
+from replay import InputRecorder
 from utils import *
 
 music_init = False
@@ -30,6 +32,8 @@ Globals.set(CURRENT_LEVEL, '')
 Globals.set(UPCOMING_LEVEL, '')
 Globals.set(MUSIC_INIT, music_init)
 Globals.set(SOUND_VALUE, 0)
+Globals.set(SOUND_ONSET, 0)
+Globals.set(SOUND_BEAT, 0)
 Globals.set(ELAPSED_TIME_FOR_SOUNDTRACK, 0)
 Globals.set(TOTAL_DURATION_OF_SOUNDTRACK, 0)
 Globals.set(CHECKPOINT, 0)
@@ -40,47 +44,111 @@ Globals.set(CHECKPOINT, 0)
 
 
 class Game:
-    def __init__(self):
+    def __init__(self, record=None, dirty_rects=False):
         self.full_screen = True
         self.screen = pygame.display.set_mode((W, H))
         self.s = pygame.Surface((WIDTH, HEIGHT))
         self.manager = MenuManager()
         self.clock = pygame.time.Clock()
+        self.scheduler = FrameScheduler(FPS)
+        self.events = []  # input waiting for the next update step
+        self.recorder = InputRecorder(record) if record else None
+        # only push the changed parts of static menus to the display, see MenuManager.draw_dirty
+        self.dirty_rects = dirty_rects
+        self.offset = self.s.get_rect(center=(W // 2, H // 2)).topleft
+
+    def handle_events(self, events: list[pygame.event.Event]):
+        for e in events:
+            if e.type == pygame.QUIT:
+                sys.exit(0)
+            if e.type == pygame.KEYDOWN:
+                if e.key == pygame.K_F3:
+                    profiler.toggle()
+                if e.key == pygame.K_ESCAPE:
+                    if self.manager.mode == 'home':
+                        if Globals.get(FIRST_TIME_PLAYED):
+                            sys.exit(0)
+                    else:
+                        self.manager.transition_manager.set_transition('fade')
+                        self.manager.subtitle_manager.clear()
+                        if self.manager.mode not in ('point', 'line', 'triangle'):
+                            self.manager.switch_mode('home', reset=False, transition=True)
+                    # sys.exit(0)
+                # if e.key == pygame.K_f:
+                #     self.full_screen = not self.full_screen
+                #     if self.full_screen:
+                #         self.screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.FULLSCREEN | pygame.SCALED)
+                #     else:
+                #         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
+
+    def update(self, events: list[pygame.event.Event], dt=None):
+        # dt -> fixed step from the scheduler, None samples the clock source (headless runs)
+        if dt is None:
+            game_clock.tick()
+        else:
+            game_clock.step(dt)
+        self.handle_events(events)
+        self.manager.update(events)
+
+    def draw(self):
+        # returns the changed screen rects, None when the whole screen changed
+        if self.dirty_rects and not profiler.visible:
+            bounds = self.s.get_rect()
+            rects = [i.clip(bounds) for i in self.manager.draw_dirty(self.s)]
+            if not rects:
+                return []
+            pygame.draw.rect(self.s, 'white', bounds, 3)
+            for i in rects:
+                self.screen.blit(self.s, i.move(self.offset), i)
+            return [i.move(self.offset) for i in rects]
+        self.screen.fill('black')
+        # self.s.fill('black')
+        self.manager.draw(self.s)
+        profiler.draw(self.s)
+        pygame.draw.rect(self.s, 'white', self.s.get_rect(), 3)
+        self.screen.blit(self.s, self.s.get_rect(center=(W // 2, H // 2)))
+
+    def idle(self):
+        # nothing animates on static menus and nobody watches an unfocused window
+        return self.manager.idle() or not pygame.key.get_focused()
 
     async def run(self):
+        self.scheduler.reset()
         while True:
+            profiler.begin_frame()
             events = pygame.event.get()
-            for e in events:
-                if e.type == pygame.QUIT:
-                    sys.exit(0)
-                if e.type == pygame.KEYDOWN:
-                    if e.key == pygame.K_ESCAPE:
-                        if self.manager.mode == 'home':
-                            if Globals.get(FIRST_TIME_PLAYED):
-                                sys.exit(0)
-                        else:
-                            self.manager.transition_manager.set_transition('fade')
-                            self.manager.subtitle_manager.clear()
-                            if self.manager.mode not in ('point', 'line', 'triangle'):
-                                self.manager.switch_mode('home', reset=False, transition=True)
-                        # sys.exit(0)
-                    # if e.key == pygame.K_f:
-                    #     self.full_screen = not self.full_screen
-                    #     if self.full_screen:
-                    #         self.screen = pygame.display.set_mode((WIDTH, HEIGHT), pygame.FULLSCREEN | pygame.SCALED)
-                    #     else:
-                    #         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
-            self.screen.fill('black')
-            # self.s.fill('black')
-            self.manager.update(events)
-            self.manager.draw(self.s)
-            pygame.draw.rect(self.s, 'white', self.s.get_rect(), 3)
-            self.screen.blit(self.s, self.s.get_rect(center=(W // 2, H // 2)))
-            pygame.display.update()
+            if self.recorder:
+                self.recorder.feed(events, self.manager.mode)
+            self.events.extend(events)
+            steps = self.scheduler.advance()
+            if steps == 0:
+                # ran ahead of the fixed step, nothing to simulate or draw yet
+                await asyncio.sleep(0)
+                self.clock.tick(self.scheduler.get_fps(self.idle()))
+                continue
+            # input goes to the first step, the rest only catch up the simulation
+            for i in range(steps):
+                self.update(self.events if i == 0 else [], self.scheduler.step)
+            self.events = []
+            rects = self.draw()
+            if rects is None:
+                profiler.measure('display.update', pygame.display.update)
+            elif rects:
+                profiler.measure('display.update', pygame.display.update, rects)
+            profiler.end_frame(self.manager.object_manager, self.manager.mode, Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK),
+                               self.manager.sound_manager)
             await asyncio.sleep(0)
             # print(self.clock.get_fps())
-            self.clock.tick(FPS)
+            self.clock.tick(self.scheduler.get_fps(self.idle()))
 
 
 if __name__ == '__main__':
-    asyncio.run(Game().run())
+    # python main.py --record take.json saves the last level attempt for headless.py
+    # python main.py --profile session.csv saves per frame timings (see profiler.py)
+    # python main.py --dirty-rects only redraws what changed on static menus
+    if '--profile' in sys.argv:
+        profiler.record(sys.argv[sys.argv.index('--profile') + 1])
+    asyncio.run(Game(
+        record=sys.argv[sys.argv.index('--record') + 1] if '--record' in sys.argv else None,
+        dirty_rects='--dirty-rects' in sys.argv
+    ).run())
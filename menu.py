@@ -3,7 +3,10 @@ import sys
 
 import pygame.draw
 
+from glyphs import glyph_atlas
 from objects import *
+from pools import gc_guard
+from profiler import profiler
 from sounds import SoundManager
 from subtitles import SubtitleManager, Subtitle, get_typed_subtitles
 from transition import TransitionManager
@@ -15,10 +18,15 @@ class Menu:
     Base signature for all menus
     """
 
+    static = False  # draw() only changes when state() does, see MenuManager.draw_dirty
+    level = False  # a song is played, the garbage collector is held back meanwhile
+
     def __init__(self, manager: 'MenuManager', name='menu'):
         self.manager = manager
         self.name = name
         self.background = 'black'
+        # level data that does not change between resets
+        self.cache: dict = self.manager.scene_cache.setdefault(self.name, {})
         self.manager.subtitle_manager.clear()
         self.manager.object_manager.clear()
         Globals.set(PREVIOUS_LEVEL, Globals.get(CURRENT_LEVEL))
@@ -30,14 +38,20 @@ class Menu:
     def update(self, events: list[pygame.event.Event]):
         pass
 
+    def state(self):
+        # everything draw() of a static menu depends on
+        return getattr(self, 'selected', None)
+
     def draw(self, surf: pygame.Surface):
         surf.fill(self.background)
         pygame.draw.rect(surf, 'white', surf.get_rect().inflate(-20, -200).move(0, 100 - 10), 3)
         # pygame.draw.rect(surf, 'white', surf.get_rect().inflate(-20, -HEIGHT + 170).move(0, -HEIGHT // 2 + 95), 3)
-        surf.blit(text(self.name, size=100, aliased=False), (50, 50))
+        glyph_atlas.draw(surf, self.name, 100, topleft=(50, 50))
 
 
 class Home(Menu):
+    static = True
+
     def __init__(self, manager: 'MenuManager', name='menu'):
         super().__init__(manager, name)
         self.options = [
@@ -78,10 +92,12 @@ class Home(Menu):
         super().draw(surf)
         for i in range(len(self.options)):
             y = 200 + i * 75
-            surf.blit(text(self.options[i], 50, 'orange' if i == self.selected else 'white'), (100, y))
+            glyph_atlas.draw(surf, self.options[i], 50, 'orange' if i == self.selected else 'white', topleft=(100, y))
 
 
 class LevelSelect(Menu):
+    static = True
+
     def __init__(self, manager: 'MenuManager', name='menu'):
         super().__init__(manager, name)
         self.options = [
@@ -119,13 +135,15 @@ class LevelSelect(Menu):
     def draw(self, surf: pygame.Surface):
         surf.fill(self.background)
         pygame.draw.rect(surf, 'white', surf.get_rect().inflate(-20, -200).move(0, 100 - 10), 3)
-        surf.blit(text("Select Level", size=100, aliased=False), (50, 50))
+        glyph_atlas.draw(surf, 'Select Level', 100, topleft=(50, 50))
         for i in range(len(self.options)):
             y = 200 + i * 75
-            surf.blit(text(self.options[i], 50, 'orange' if i == self.selected else 'white'), (100, y))
+            glyph_atlas.draw(surf, self.options[i], 50, 'orange' if i == self.selected else 'white', topleft=(100, y))
 
 
 class Credits(Menu):
+    static = True
+
     def __init__(self, manager: 'MenuManager', name='menu'):
         super().__init__(manager, name)
         self.options = [
@@ -189,10 +207,12 @@ class Credits(Menu):
         super().draw(surf)
         for i in range(len(self.options)):
             y = 200 + i * 60
-            surf.blit(text(self.options[i], 50, 'orange' if i == self.selected else 'white'), (100, y))
+            glyph_atlas.draw(surf, self.options[i], 50, 'orange' if i == self.selected else 'white', topleft=(100, y))
 
 
 class Quit(Menu):
+    static = True
+
     def __init__(self, manager, name):
         super().__init__(manager, name)
         if Globals.get(FIRST_TIME_PLAYED):
@@ -228,6 +248,8 @@ class Quit(Menu):
 
 
 class Help(Menu):
+    static = True
+
     def draw(self, surf: pygame.Surface):
         _text = [
             'WASD or arrows to move',
@@ -247,6 +269,8 @@ class Help(Menu):
 
 
 class Intro(Menu):
+    static = True
+
     def __init__(self, manager: 'MenuManager', name='menu'):
         super().__init__(manager, name)
         _text = [
@@ -270,6 +294,8 @@ class Intro(Menu):
 
 
 class LevelIntro(Menu):
+    static = True
+
     def __init__(self, manager: 'MenuManager', name='menu'):
         super().__init__(manager, name)
         self.upcoming_level = Globals.get(UPCOMING_LEVEL)
@@ -304,6 +330,8 @@ class LevelIntro(Menu):
 
 
 class Retry(Menu):
+    static = True
+
     def __init__(self, manager: 'MenuManager', name='menu'):
         super().__init__(manager, name)
         message = Globals.get(RETRY_MESSAGE) or ''
@@ -348,21 +376,22 @@ class Retry(Menu):
 
     def draw(self, surf: pygame.Surface):
         surf.fill(self.background)
-        t = text(self.message)
-        surf.blit(t, t.get_rect(center=(WIDTH // 2, HEIGHT // 2)))
+        glyph_atlas.draw(surf, self.message, center=(WIDTH // 2, HEIGHT // 2))
         x1 = WIDTH / 4
         x2 = WIDTH * 3 / 4
-        t = text(self.options[0], color='orange' if self.selected == 0 else 'white')
-        surf.blit(t, t.get_rect(center=(x1, HEIGHT // 2 + 150)))
-        t = text(self.options[1], color='orange' if self.selected == 1 else 'white')
-        surf.blit(t, t.get_rect(center=(x2, HEIGHT // 2 + 150)))
+        glyph_atlas.draw(surf, self.options[0], color='orange' if self.selected == 0 else 'white', center=(x1, HEIGHT // 2 + 150))
+        glyph_atlas.draw(surf, self.options[1], color='orange' if self.selected == 1 else 'white', center=(x2, HEIGHT // 2 + 150))
 
 
 class PointEnemyScene(Menu):
+    level = True
+
     def __init__(self, manager: 'MenuManager', name='menu'):
         super().__init__(manager, name)
         self.manager.object_manager.init()
-        self.manager.object_manager.add(PointEnemy())
+        enemy = PointEnemy(patterns=self.cache.get('patterns'))
+        self.cache['patterns'] = enemy.launching_patterns, enemy.enemy_launch_patterns
+        self.manager.object_manager.add(enemy)
         # self.manager.object_manager.add(PointSpreadBullet(target_pos=(WIDTH // 2, 150)))
         self.manager.sound_manager.stop()
         self.manager.sound_manager.play('points', start=Globals.get(CHECKPOINT) if Globals.get(CHECKPOINT) else 0)
@@ -415,10 +444,14 @@ class PointEnemyScene(Menu):
 
 
 class LineEnemyScene(Menu):
+    level = True
+
     def __init__(self, manager: 'MenuManager', name='menu'):
         super().__init__(manager, name)
         self.manager.object_manager.init()
-        self.manager.object_manager.add(LineEnemy())
+        enemy = LineEnemy(patterns=self.cache.get('patterns'))
+        self.cache['patterns'] = enemy.launching_patterns, enemy.enemy_launch_patterns
+        self.manager.object_manager.add(enemy)
         self.manager.sound_manager.stop()
         self.manager.sound_manager.play('lines', start=Globals.get(CHECKPOINT) if Globals.get(CHECKPOINT) else 0)
         self.theme_color = 'blue'
@@ -468,11 +501,15 @@ class LineEnemyScene(Menu):
 
 
 class TriangleEnemyScene(Menu):
+    level = True
+
     def __init__(self, manager: 'MenuManager', name='menu'):
         super().__init__(manager, name)
         self.manager.object_manager.init()
         # Globals.set(CHECKPOINT, 0)
-        self.manager.object_manager.add(TriangleEnemy())
+        enemy = TriangleEnemy(patterns=self.cache.get('patterns'))
+        self.cache['patterns'] = enemy.launching_patterns, enemy.enemy_launch_patterns
+        self.manager.object_manager.add(enemy)
         self.manager.sound_manager.stop()
         self.manager.sound_manager.play('triangles', start=Globals.get(CHECKPOINT) if Globals.get(CHECKPOINT) else 0)
         self.checkpoints = [
@@ -600,7 +637,7 @@ class Settings(Menu):
             self.pins.pop(self.pin_to_del)
             self.pin_state.pop(self.pin_to_del)
             self.pin_to_del = None
-            self.manager.object_manager.add(PointClicked(*v))
+            self.manager.object_manager.add(PointClicked.spawn(*v))
 
         if len(self.pins) == 0 and self.notice_rect.top <= WIDTH:
             self.notice_vel += self.notice_acc * dt
@@ -651,34 +688,50 @@ class MenuManager:
         self.subtitle_manager: SubtitleManager = SubtitleManager()
         self.object_manager: ObjectManager = ObjectManager()
         self.sound_manager = SoundManager()
-        self.menus = {
-            'home': Home(self, 'home'),
-            'intro': Intro(self, 'intro'),
-            'quit': Quit(self, 'quit'),
-            'help': Help(self, 'help'),
-            'settings': Settings(self, 'settings'),
-            'credits': Credits(self, 'credits'),
-
-            'level-select': LevelSelect(self, 'level-select'),
-            'level-intro': LevelIntro(self, 'level-intro'),
-            'retry': Retry(self, 'retry'),
-
-            'point': PointEnemyScene(self, 'point'),
-            'line': LineEnemyScene(self, 'line'),
-            'triangle': TriangleEnemyScene(self, 'triangle')
+        # scenes are registered as factories and only built on first use
+        self.factories = {
+            'home': Home,
+            'intro': Intro,
+            'quit': Quit,
+            'help': Help,
+            'settings': Settings,
+            'credits': Credits,
+
+            'level-select': LevelSelect,
+            'level-intro': LevelIntro,
+            'retry': Retry,
+
+            'point': PointEnemyScene,
+            'line': LineEnemyScene,
+            'triangle': TriangleEnemyScene
         }
+        self.menus: dict[str, Menu] = {}
+        self.scene_cache: dict[str, dict] = {}  # survives Menu.reset, see Menu.cache
+        # dirty rect rendering of static menus, see draw_dirty
+        self.background = pygame.Surface((WIDTH, HEIGHT))
+        self.background_menu = None
+        self.background_state = None
+        self.drawn_subtitle = None
+        self.drawn_subtitle_rect = None
         self.subtitle_manager.clear()
         self.object_manager.clear()
-        self.mode = 'home'  # initial mode
-        self.menu = self.menus[self.mode]
         self.sound_manager.stop()
-        self.menu.reset()
+        self.mode = 'home'  # initial mode
+        self.menu = self.get_menu(self.mode)
 
     def reset(self):
         self.__init__()
 
+    def get_menu(self, mode, reset=False):
+        # building a scene for the first time is the same as resetting it
+        if mode not in self.menus:
+            self.menus[mode] = self.factories[mode](self, mode)
+        elif reset:
+            self.menus[mode].reset()
+        return self.menus[mode]
+
     def switch_mode(self, mode, reset=True, transition=False):
-        if mode in self.menus:
+        if mode in self.factories:
             self.object_manager.clear()
             self.subtitle_manager.clear()
             if transition:
@@ -687,12 +740,21 @@ class MenuManager:
                 self.transition_manager.close()
             else:
                 self.mode = mode
-                self.menu = self.menus[self.mode]
-                if reset:
-                    self.menu.reset()
+                self.menu = self.get_menu(self.mode, reset)
+                if self.menu.level:
+                    gc_guard.enter()
+                else:
+                    gc_guard.exit(report=profiler.active)
             # self.subtitle_manager.clear()
 
+    def idle(self):
+        # a static menu with nothing animating on top of it
+        return self.menu.static and self.to_switch == 'none' and self.subtitle_manager.idle() and \
+            not self.transition_manager.transition.visible
+
     def update(self, events: list[pygame.event.Event]):
+        # soundtrack time first, so every update step times its patterns against the music
+        self.sound_manager.update_time()
         # print(self.transition_manager.transition.k)
         for e in events:
             # if e.type == pygame.MOUSEBUTTONDOWN:
@@ -725,16 +787,46 @@ class MenuManager:
                 self.to_switch = 'none'
                 self.to_reset = False
                 self.transition_manager.open()
-        self.menu.update(events)
-        self.object_manager.update(events)
-        self.transition_manager.update(events)
-        self.subtitle_manager.update()
+        profiler.measure('menu.update', self.menu.update, events)
+        profiler.measure('object_manager.update', self.object_manager.update, events)
+        profiler.measure('transition_manager', self.transition_manager.update, events)
+        profiler.measure('subtitle_manager', self.subtitle_manager.update)
 
     def draw(self, surf: pygame.Surface):
-        self.menu.draw(surf)
-        self.object_manager.draw(surf)
-        self.transition_manager.draw(surf)
-        self.subtitle_manager.draw(surf)
-        self.sound_manager.update_time()
+        profiler.measure('menu.draw', self.menu.draw, surf)
+        profiler.measure('object_manager.draw', self.object_manager.draw, surf)
+        profiler.measure('transition_manager', self.transition_manager.draw, surf)
+        profiler.measure('subtitle_manager', self.subtitle_manager.draw, surf)
+        self.background_menu = None
         # surf.blit(text(Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK).__str__(), color='white'), (0, 150))
         # surf.blit(text(self.transition_manager.transition.status, color='black'), (0, 0))
+
+    def draw_dirty(self, surf: pygame.Surface) -> list[pygame.Rect]:
+        # same output as draw() but only repaints what changed since the last frame, returns the changed rects
+        # static menus are drawn once to a cached background, anything else falls back to a full redraw
+        menu = self.menu
+        if not menu.static or self.transition_manager.transition.visible or \
+                self.object_manager.objects or self.object_manager.player:
+            self.draw(surf)
+            return [surf.get_rect()]
+        rects = []
+        state = menu.state()
+        if menu is not self.background_menu or state != self.background_state:
+            profiler.measure('menu.draw', menu.draw, self.background)
+            self.background_menu = menu
+            self.background_state = state
+            self.drawn_subtitle = self.drawn_subtitle_rect = None
+            surf.blit(self.background, (0, 0))
+            rects.append(surf.get_rect())
+        subtitle = self.subtitle_manager.current_subtitle
+        rect = subtitle.rect if subtitle else None
+        if subtitle is not self.drawn_subtitle or rect != self.drawn_subtitle_rect:
+            for i in (self.drawn_subtitle_rect, rect):
+                if i:
+                    surf.blit(self.background, i, i)
+                    rects.append(i)
+            if subtitle:
+                profiler.measure('subtitle_manager', subtitle.draw, surf)
+            self.drawn_subtitle = subtitle
+            self.drawn_subtitle_rect = rect
+        return rects
@@ -1,47 +1,109 @@
 import random
 from math import sin, cos, radians, degrees, atan2
-from operator import attrgetter
+from collections import Counter
 from typing import Union
 
+import numpy
 import pygame.event
 
+from collision import SpatialHash
 from config import WIDTH, HEIGHT, Globals
 from constants import *
+from pools import object_pool
+from profiler import profiler
+from sprites import sprite_cache
+from timeline import load_timeline, timeline_source_hash
 from utils import *
 
 
 class BaseObject:
-    def __init__(self):
+    collides = False  # objects with a check_collision go through the broad phase
+    pooled = False  # dead objects are recycled, reset() takes the constructor arguments, see spawn()
+    __slots__ = ('alive', 'z', 'object_manager')
+
+    def __init__(self, *args, **kwargs):
+        self.reset(*args, **kwargs)
+
+    def reset(self):
         self.alive = True
         self.z = 0
         self.object_manager: Union[ObjectManager, None] = None
 
+    @classmethod
+    def spawn(cls, *args, **kwargs):
+        # a recycled instance of pooled classes, a new one otherwise
+        if cls.pooled:
+            return object_pool.spawn(cls, *args, **kwargs)
+        return cls(*args, **kwargs)
+
     def update(self, events: list[pygame.event.Event]):
         pass
 
     def draw(self, surf: pygame.Surface):
         pass
 
+    def get_sprite(self):
+        # (surface, position) from the sprite cache to be batch blitted instead of draw()
+        return None
+
     def check_collision(self, player: 'Player'):
         pass
 
+    def get_bounds(self):
+        # bounding box (left, top, right, bottom) for the broad phase
+        # None sends the object to the narrow phase every frame
+        return None
+
 
 class Enemy(BaseObject):
+    timeline = ''  # name of the compiled pattern timeline, see timeline.py
+    __slots__ = ()
+
     def use_ai(self, player: 'Player'):
         if not player:
             return
 
+    @staticmethod
+    def get_launching_patterns():
+        return []
+
+    @staticmethod
+    def get_enemy_launch_patterns(pos):
+        return []
+
+    @classmethod
+    def load_patterns(cls, pos):
+        # compiled timeline when it is up to date with the code, in-code definitions otherwise
+        timeline = load_timeline(cls.timeline) if cls.timeline else None
+        source_hash = timeline_source_hash(cls)
+        if timeline is not None and (source_hash is None or timeline.source_hash == source_hash):
+            return timeline.launching_patterns(globals()), timeline.enemy_launch_patterns(globals(), pos)
+        return cls.get_launching_patterns(), cls.get_enemy_launch_patterns(pos)
+
 
 class Player(BaseObject):
+    TRAIL_CAPACITY = 20
+    TRAIL_FADE = 35  # alpha lost by an afterimage every frame
+    __slots__ = ('x', 'y', 'size', 'trail_surfaces', 'trail', 'trail_ages', 'trail_start', 'trail_count')
+
     def __init__(self, x=WIDTH // 2, y=HEIGHT // 2 + 150):
         super().__init__()
         self.x = x
         self.y = y
         self.size = 15
         self.z = 1
-        self.rect_list = []
-        self.surf = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
-        self.surf.fill('blue')
+        # afterimage trail, a ring buffer of [surface, [x, y]] blit entries
+        # the surface of an entry is the pre-faded one for its age
+        self.trail_surfaces = []
+        for alpha in range(255 - self.TRAIL_FADE, 0, -self.TRAIL_FADE):
+            surf = pygame.Surface((self.size, self.size), pygame.SRCALPHA)
+            surf.fill('blue')
+            surf.set_alpha(alpha)
+            self.trail_surfaces.append(surf)
+        self.trail = [[self.trail_surfaces[0], [0, 0]] for _ in range(self.TRAIL_CAPACITY)]
+        self.trail_ages = [0] * self.TRAIL_CAPACITY
+        self.trail_start = 0
+        self.trail_count = 0
 
     @property
     def pos(self):
@@ -54,7 +116,7 @@ class Player(BaseObject):
     def update(self, events: list[pygame.event.Event]):
         speed = 7
         v = pygame.Vector2(0, 0)
-        keys = pygame.key.get_pressed()
+        keys = get_pressed()
         if keys[pygame.K_RSHIFT] or keys[pygame.K_LSHIFT]:
             speed *= 3
         if keys[pygame.K_LEFT] or keys[pygame.K_a]:
@@ -76,8 +138,13 @@ class Player(BaseObject):
         if v.length() != 0:
             self.x += v.x
             self.y += v.y
-            if len(self.rect_list) < 20:
-                self.rect_list.append([self.x, self.y, 255])
+            if self.trail_count < self.TRAIL_CAPACITY:
+                i = (self.trail_start + self.trail_count) % self.TRAIL_CAPACITY
+                dest = self.trail[i][1]
+                dest[0] = int(self.x) - self.size // 2
+                dest[1] = int(self.y) - self.size // 2
+                self.trail_ages[i] = 0
+                self.trail_count += 1
         offset = 5 + self.size // 2
 
         self.x = clamp(self.x, offset, WIDTH - offset)
@@ -85,21 +152,33 @@ class Player(BaseObject):
 
     def draw(self, surf: pygame.Surface):
         rect = self.rect
-        self.rect_list = [i for i in self.rect_list if i[2] > 1]
-        for i in self.rect_list:
-            i[2] -= 35
-            i[2] = clamp(i[2], 0, 255)
-            color = [0, 0, i[2]]
-            self.surf.set_alpha(i[2])
-            # pygame.draw.rect(surf, '#00AAFF', (i[0], i[1], 10, 10))
-            # pygame.draw.rect(surf, color, (i[0] - self.size // 2, i[1] - self.size // 2, self.size, self.size))
-            surf.blit(self.surf, self.surf.get_rect(center=i[0:2]))
+        capacity = self.TRAIL_CAPACITY
+        faded = len(self.trail_surfaces)
+        ages = self.trail_ages
+        # entries are oldest first, so the faded out ones are always at the start
+        while self.trail_count and ages[self.trail_start] >= faded:
+            self.trail_start = (self.trail_start + 1) % capacity
+            self.trail_count -= 1
+        start = self.trail_start
+        for k in range(self.trail_count):
+            i = (start + k) % capacity
+            self.trail[i][0] = self.trail_surfaces[ages[i]]
+            ages[i] += 1
+        if self.trail_count:
+            surf.blits((self.trail[(start + k) % capacity] for k in range(self.trail_count)), doreturn=False)
         pygame.draw.rect(surf, 'blue', rect)
 
 
 class PointBullet(BaseObject):
-    def __init__(self, x=WIDTH // 2, y=HEIGHT // 2, dx=1.0, dy=1.0, r=5, color='red'):
-        super().__init__()
+    """
+    Reference implementation of one point bullet, the game keeps them in PointBulletPool
+    tests/test_point_bullets.py checks the pool against it frame by frame
+    """
+    collides = True
+    __slots__ = ('x', 'y', 'dx', 'dy', 'speed', 'r', 'color')
+
+    def reset(self, x=WIDTH // 2, y=HEIGHT // 2, dx=1.0, dy=1.0, r=5, color='red'):
+        super().reset()
         self.x = x
         self.y = y
         self.dx = dx
@@ -115,6 +194,10 @@ class PointBullet(BaseObject):
     def check_collision(self, player: 'Player'):
         return player.rect.inflate(-5, -5).colliderect(self.rect)
 
+    def get_bounds(self):
+        rect = self.rect
+        return rect.left, rect.top, rect.right, rect.bottom
+
     def update(self, events: list[pygame.event.Event]):
         self.x += self.dx * self.speed
         self.y += self.dy * self.speed
@@ -126,10 +209,141 @@ class PointBullet(BaseObject):
         pygame.draw.circle(surf, 'white', (self.x, self.y), self.r)
         pygame.draw.circle(surf, self.color, (self.x, self.y), self.r, 2 if self.r > 3 else 1)
 
+    def get_sprite(self):
+        # draw.circle truncates its centre towards zero, the sprite has to start from the same pixel
+        sprite, (ox, oy) = sprite_cache.get('point', self.r, self.color)
+        return sprite, (int(self.x) - ox, int(self.y) - oy)
+
+
+class PointBulletPool:
+    """
+    Structure-of-arrays storage for point bullets
+    Positions, velocities, radii and alive flags live in contiguous numpy arrays
+    so the whole pool is integrated, culled and collided in one step per frame
+    Behaves exactly like a list of PointBullet objects handled by ObjectManager
+    """
+    z = 0  # drawn after the objects of its layer, like PointBullets added last
+
+    def __init__(self, capacity=1024, speed=2, color='red'):
+        self.capacity = capacity
+        self.speed = speed
+        self.color = color
+        self.x = numpy.zeros(capacity)
+        self.y = numpy.zeros(capacity)
+        self.dx = numpy.zeros(capacity)
+        self.dy = numpy.zeros(capacity)
+        self.r = numpy.zeros(capacity, dtype=numpy.int32)
+        self.alive = numpy.zeros(capacity, dtype=bool)
+        self.size = 0  # bullets taking part in the current frame
+        self.count = 0  # size + bullets spawned during the current frame
+
+    def __len__(self):
+        return self.size
+
+    def clear(self):
+        self.alive[:self.count] = False
+        self.size = 0
+        self.count = 0
+
+    def _reserve(self, n):
+        if self.count + n <= self.capacity:
+            return
+        capacity = self.capacity
+        while self.count + n > capacity:
+            capacity *= 2
+        for name in ('x', 'y', 'dx', 'dy', 'r', 'alive'):
+            old = getattr(self, name)
+            new = numpy.zeros(capacity, dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    def spawn(self, x, y, dx, dy, r=5):
+        self._reserve(1)
+        i = self.count
+        self.x[i] = x
+        self.y[i] = y
+        self.dx[i] = dx
+        self.dy[i] = dy
+        self.r[i] = r
+        self.alive[i] = True
+        self.count += 1
+
+    def spawn_angles(self, x, y, angles, vel=1.0, r=5):
+        # one bullet per angle (in degrees), all launched from (x, y)
+        angles = numpy.radians(numpy.fromiter(angles, dtype=float))
+        n = len(angles)
+        if n == 0:
+            return 0
+        self._reserve(n)
+        s = slice(self.count, self.count + n)
+        self.x[s] = x
+        self.y[s] = y
+        numpy.multiply(numpy.cos(angles), vel, out=self.dx[s])
+        numpy.multiply(numpy.sin(angles), vel, out=self.dy[s])
+        self.r[s] = r
+        self.alive[s] = True
+        self.count += n
+        return n
+
+    def flush(self):
+        # drops dead bullets and brings in the ones spawned last frame
+        # same as the list rebuild in ObjectManager.update
+        n = self.count
+        keep = self.alive[:n]
+        k = int(numpy.count_nonzero(keep))
+        if k != n:
+            for arr in (self.x, self.y, self.dx, self.dy, self.r):
+                arr[:k] = arr[:n][keep]
+            self.alive[:k] = True
+            self.alive[k:n] = False
+        self.size = self.count = k
+
+    def check_collision(self, player: 'Player'):
+        n = self.size
+        if n == 0 or player is None:
+            return False
+        # PointBullet.rect -> Rect(x - r // 2, y - r // 2, r * 2, r * 2).inflate(-2, -2)
+        # pygame truncates float coordinates towards zero
+        r = self.r[:n]
+        left = numpy.trunc(self.x[:n] - r // 2) + 1
+        top = numpy.trunc(self.y[:n] - r // 2) + 1
+        size = r * 2 - 2
+        p = player.rect.inflate(-5, -5)
+        hit = (left < p.right) & (left + size > p.left) & (top < p.bottom) & (top + size > p.top) & (size > 0)
+        return bool(hit.any())
+
+    def update(self, events: list[pygame.event.Event]):
+        n = self.size
+        if n == 0:
+            return
+        x = self.x[:n]
+        y = self.y[:n]
+        x += self.dx[:n] * self.speed
+        y += self.dy[:n] * self.speed
+        self.alive[:n] &= (0 <= x) & (x <= WIDTH) & (0 <= y) & (y <= HEIGHT)
+
+    def draw(self, surf: pygame.Surface):
+        n = self.size
+        if n == 0:
+            return
+        # one cache lookup per radius, the blit positions come straight from the arrays,
+        # centres truncated towards zero as in PointBullet.get_sprite
+        radii, index = numpy.unique(self.r[:n], return_inverse=True)
+        sprites = [sprite_cache.get('point', r, self.color) for r in radii.tolist()]
+        surfaces = [sprite for sprite, _ in sprites]
+        offsets = numpy.array([offset for _, offset in sprites], dtype=numpy.int64)[index]
+        x = (self.x[:n].astype(numpy.int64) - offsets[:, 0]).tolist()
+        y = (self.y[:n].astype(numpy.int64) - offsets[:, 1]).tolist()
+        surf.blits(zip(map(surfaces.__getitem__, index.tolist()), zip(x, y)), doreturn=False)
+
 
 class PointSpreadBullet(BaseObject):
-    def __init__(self, pos=(WIDTH // 2, HEIGHT // 2), target_pos=(WIDTH // 2, HEIGHT // 2)):
-        super().__init__()
+    pooled = True
+    __slots__ = ('pos', 'target_pos', 'r')
+
+    def reset(self, pos=(WIDTH // 2, HEIGHT // 2), target_pos=(WIDTH // 2, HEIGHT // 2)):
+        super().reset()
         self.pos = pygame.Vector2(pos)
         self.target_pos = pygame.Vector2(target_pos)
         self.r = 0
@@ -144,14 +358,9 @@ class PointSpreadBullet(BaseObject):
         else:
             self.pos += _dx / 20
         if self.pos == self.target_pos:
-            _bullets = []
             speed = 3
             offset = random.randint(-15, 15)
-            for i in range(offset, 360 + offset, 30):
-                dx = cos(radians(i)) * speed
-                dy = sin(radians(i)) * speed
-                _bullets.append(PointBullet(self.pos.x, self.pos.y, dx, dy, r=3))
-            self.object_manager.add_multiple(_bullets)
+            self.object_manager.point_bullets.spawn_angles(self.pos.x, self.pos.y, range(offset, 360 + offset, 30), speed, r=3)
             self.alive = False
 
     def draw(self, surf: pygame.Surface):
@@ -160,15 +369,19 @@ class PointSpreadBullet(BaseObject):
 
 
 class LineBullet(BaseObject):
-    def __init__(self, x=WIDTH // 2, y=HEIGHT // 2, dx=1.0, dy=1.0):
-        super().__init__()
+    collides = True
+    pooled = True
+    __slots__ = ('x', 'y', 'speed', 'dx', 'dy', 'length', 'start')
+
+    def reset(self, x=WIDTH // 2, y=HEIGHT // 2, dx=1.0, dy=1.0):
+        super().reset()
         self.x = x
         self.y = y
         self.speed = 1
         self.dx = dx
         self.dy = dy
         self.length = WIDTH
-        self.timer = Timer(1)
+        self.start = now()  # lives for a second
 
     def check_collision(self, player: 'Player'):
         return player.rect.clipline(*self.points)
@@ -177,11 +390,15 @@ class LineBullet(BaseObject):
     def points(self):
         return (self.x, self.y), (self.x + self.length * self.dx, self.y + self.length * self.dy)
 
+    def get_bounds(self):
+        (x1, y1), (x2, y2) = self.points
+        return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
     def update(self, events: list[pygame.event.Event]):
         # if self.move:
         #     self.x += self.dx * self.speed
         #     self.y += self.dy * self.speed
-        if self.timer.tick:
+        if now() - self.start > 1:
             self.alive = False
 
     def draw(self, surf: pygame.Surface):
@@ -189,14 +406,19 @@ class LineBullet(BaseObject):
 
 
 class LineBullet1(BaseObject):
-    def __init__(self, x=WIDTH // 2, y=HEIGHT // 2, dx=1.0, dy=1.0, length=10, speed=1):
-        super().__init__()
+    collides = True
+    pooled = True
+    __slots__ = ('x', 'y', 'speed', 'dx', 'dy', 'length', 'sprite')
+
+    def reset(self, x=WIDTH // 2, y=HEIGHT // 2, dx=1.0, dy=1.0, length=10, speed=1):
+        super().reset()
         self.x = x
         self.y = y
         self.speed = speed
         self.dx = dx
         self.dy = dy
         self.length = length
+        self.sprite = None
         # self.timer = Timer(10)
 
     @property
@@ -206,6 +428,10 @@ class LineBullet1(BaseObject):
     def check_collision(self, player: 'Player'):
         return player.rect.clipline(*self.points)
 
+    def get_bounds(self):
+        (x1, y1), (x2, y2) = self.points
+        return min(x1, x2), min(y1, y2), max(x1, x2), max(y1, y2)
+
     def update(self, events: list[pygame.event.Event]):
         self.x += self.dx * self.speed
         self.y += self.dy * self.speed
@@ -219,10 +445,21 @@ class LineBullet1(BaseObject):
         pygame.draw.line(surf, 'blue', points[0], points[1], 5)
         pygame.draw.line(surf, 'white', points[0], points[1], 2)
 
+    def get_sprite(self):
+        if self.sprite is None:
+            length = math.hypot(self.dx, self.dy) * self.length
+            self.sprite = sprite_cache.get('line', round(length), 'blue', math.degrees(math.atan2(self.dy, self.dx)),
+                                           sprite_cache.line_step(length))
+        sprite, (ox, oy) = self.sprite
+        return sprite, (self.x - ox, self.y - oy)
+
 
 class LineSpreadBullet(BaseObject):
-    def __init__(self, pos=(WIDTH // 2, HEIGHT // 2), target_pos=(WIDTH // 2, HEIGHT // 2)):
-        super().__init__()
+    pooled = True
+    __slots__ = ('pos', 'target_pos')
+
+    def reset(self, pos=(WIDTH // 2, HEIGHT // 2), target_pos=(WIDTH // 2, HEIGHT // 2)):
+        super().reset()
         self.pos = pygame.Vector2(pos)
         self.target_pos = pygame.Vector2(target_pos)
 
@@ -240,7 +477,7 @@ class LineSpreadBullet(BaseObject):
             for i in range(offset, 360 + offset, 30):
                 dx = cos(radians(i)) * speed
                 dy = sin(radians(i)) * speed
-                _bullets.append(LineBullet1(self.pos.x, self.pos.y, dx, dy, speed=3))
+                _bullets.append(LineBullet1.spawn(self.pos.x, self.pos.y, dx, dy, speed=3))
             self.object_manager.add_multiple(_bullets)
             self.alive = False
 
@@ -253,24 +490,75 @@ class LineSpreadBullet(BaseObject):
 
 
 class LineRay(BaseObject):
-    def __init__(self, x=WIDTH // 2, y=HEIGHT // 2, player_x=0, player_y=0):
-        super().__init__()
+    """
+    Ray of the line enemy, grows out, sweeps up to 60 degrees and retracts
+    Every 10ms of the sweep leaves a full length ray behind for a second, kept in a ring buffer of
+    (time, end) instead of one LineBullet each, hit tested with one clipline per live ray like those
+    and drawn as one polygon
+    """
+
+    collides = True
+    pooled = True
+    RAY_CAPACITY = 128  # rays left behind at once, one per 10ms for RAY_LIFETIME
+    RAY_LIFETIME = 1
+    __slots__ = (
+        'x', 'y', 'angle', 'length', 'start', 'ray_time', 'offset', 'k', 'angle_offset', 'original_angle_offset',
+        'done', 'retracted', 'last_update', 'ray_times', 'ray_ends', 'ray_start', 'ray_count'
+    )
+
+    def reset(self, x=WIDTH // 2, y=HEIGHT // 2, player_x=0, player_y=0):
+        super().reset()
         self.x = x
         self.y = y
         self.angle = degrees(atan2(player_y - self.y, player_x - self.x))
         self.length = 0
-        self.timer = Timer(3)
-        self.ray_timer = Timer(0.01)
+        self.start = now()  # retracts after 3 seconds
+        self.ray_time = now()  # last ray left behind, one every 10ms
         self.offset = 30
-        self.t = Timer(2)
         self.k = random.choice([-1, 1])
         self.angle_offset = self.angle + self.offset * self.k
         self.original_angle_offset = self.angle_offset
         self.done = False
+        self.retracted = None  # time the ray was fully retracted, it stays until its rays are gone
+        self.last_update = now()
+        self.ray_times = [0.0] * self.RAY_CAPACITY
+        self.ray_ends = [(0.0, 0.0)] * self.RAY_CAPACITY
+        self.ray_start = 0
+        self.ray_count = 0
+
+    def rays(self, hitting=False):
+        # indices of the buffered rays, oldest first, a ray left this frame only shows from the next one
+        # a ray dies in the first update more than RAY_LIFETIME after it was left, is still drawn that frame
+        # but does not hit anymore, it is dropped from the buffer by the next update
+        _time = now()
+        for k in range(self.ray_count):
+            i = (self.ray_start + k) % self.RAY_CAPACITY
+            if self.ray_times[i] < _time and not (hitting and self.last_update - self.ray_times[i] > self.RAY_LIFETIME):
+                yield i
+
+    def check_collision(self, player: 'Player'):
+        clipline = player.rect.clipline
+        origin = self.x, self.y
+        ends = self.ray_ends
+        for i in self.rays(hitting=True):
+            if clipline(origin, ends[i]):
+                return True
+        return False
 
     def update(self, events: list[pygame.event.Event]):
         # self.x += self.dx * self.speed
         # self.y += self.dy * self.speed
+        _time = now()
+        capacity = self.RAY_CAPACITY
+        while self.ray_count and self.last_update - self.ray_times[self.ray_start] > self.RAY_LIFETIME:
+            self.ray_start = (self.ray_start + 1) % capacity
+            self.ray_count -= 1
+        self.last_update = _time
+
+        if self.retracted is not None:
+            if not self.ray_count:
+                self.alive = False
+            return
 
         self.length += 10 if not self.done else -10
 
@@ -278,9 +566,9 @@ class LineRay(BaseObject):
             self.length = WIDTH
         if self.length < 0:
             self.length = 0
-            self.alive = False
+            self.retracted = _time
 
-        if self.timer.tick:
+        if _time - self.start > 3:
             self.done = True
 
         if abs(self.original_angle_offset - self.angle_offset) >= self.offset * 2:
@@ -288,34 +576,55 @@ class LineRay(BaseObject):
 
         if not self.done and self.length >= WIDTH:
             self.angle_offset -= self.k * 2
-            if self.ray_timer.tick:
-                dx = cos(radians(self.angle_offset))
-                dy = sin(radians(self.angle_offset))
-                self.object_manager.add(
-                    LineBullet(self.x, self.y, dx, dy)
-                )
+            if _time - self.ray_time > 0.01:
+                self.ray_time = _time
+                if self.ray_count == capacity:
+                    self.ray_start = (self.ray_start + 1) % capacity
+                    self.ray_count -= 1
+                i = (self.ray_start + self.ray_count) % capacity
+                self.ray_times[i] = _time
+                self.ray_ends[i] = (self.x + WIDTH * cos(radians(self.angle_offset)),
+                                    self.y + WIDTH * sin(radians(self.angle_offset)))
+                self.ray_count += 1
 
         # if not ((0 <= self.x <= WIDTH) and (0 <= self.y <= HEIGHT)):
         #     self.alive = False
 
     def draw(self, surf: pygame.Surface):
-        for i in (self.angle - self.offset, self.angle + self.offset):
-            dx = cos(radians(i))
-            dy = sin(radians(i))
-            if not self.done:
-                pygame.draw.line(surf, 'red',
-                                 (self.x, self.y),
-                                 (self.x + dx * self.length, self.y + dy * self.length), 5)
-                # pygame.draw.line(surf, 'white',
-                #                  (self.x, self.y),
-                #                  (self.x + dx * self.length, self.y + dy * self.length), 1)
-            else:
-                pygame.draw.line(surf, 'red', (self.x + dx * (WIDTH - self.length), self.y + dy * (WIDTH - self.length)),
-                                 (self.x + dx * WIDTH, self.y + dy * WIDTH), 3)
+        if self.retracted is None or self.retracted == now():
+            for i in (self.angle - self.offset, self.angle + self.offset):
+                dx = cos(radians(i))
+                dy = sin(radians(i))
+                if not self.done:
+                    pygame.draw.line(surf, 'red',
+                                     (self.x, self.y),
+                                     (self.x + dx * self.length, self.y + dy * self.length), 5)
+                    # pygame.draw.line(surf, 'white',
+                    #                  (self.x, self.y),
+                    #                  (self.x + dx * self.length, self.y + dy * self.length), 1)
+                else:
+                    pygame.draw.line(surf, 'red', (self.x + dx * (WIDTH - self.length), self.y + dy * (WIDTH - self.length)),
+                                     (self.x + dx * WIDTH, self.y + dy * WIDTH), 3)
+        # the rays as one outline going out and back along each of them
+        origin = self.x, self.y
+        points = []
+        for i in self.rays():
+            points.append(origin)
+            points.append(self.ray_ends[i])
+        if len(points) > 2:
+            pygame.draw.polygon(surf, 'white', points, 1)
+        elif points:
+            pygame.draw.line(surf, 'white', *points)
 
 
 class PointEnemy(Enemy):
-    def __init__(self, x=WIDTH // 2, y=HEIGHT // 2):
+    timeline = 'point'
+    __slots__ = (
+        'x', 'y', 'r', 'phase', 'phase_timer', 'bullet_timer', 'offset', 'launching_patterns',
+        'enemy_launch_patterns', 'launch_schedule', 'enemy_schedule', 'k', 'k1'
+    )
+
+    def __init__(self, x=WIDTH // 2, y=HEIGHT // 2, patterns=None):
         super().__init__()
         self.x = x
         self.y = y
@@ -326,6 +635,18 @@ class PointEnemy(Enemy):
         self.z = 1
         self.offset = 0
 
+        # patterns -> (launching_patterns, enemy_launch_patterns) shared by a scene across resets
+        self.launching_patterns, self.enemy_launch_patterns = patterns or self.load_patterns(self.pos)
+        self.launch_schedule = PatternSchedule(self.launching_patterns)
+        self.enemy_schedule = PatternSchedule(self.enemy_launch_patterns)
+        self.launch_schedule.seek(Globals.get(CHECKPOINT) or 0)
+        self.enemy_schedule.seek(Globals.get(CHECKPOINT) or 0)
+
+        self.k = 0
+        self.k1 = 0
+
+    @staticmethod
+    def get_launching_patterns():
         def get_all_range(step=0, offset=0):
             return range(offset, 360 + offset, step)
 
@@ -344,7 +665,7 @@ class PointEnemy(Enemy):
             _list = [[initial_time + dt * j, [i for i in get_all_range(step=step, offset=offset * j)], vel] for j in range(beats)]
             return _list
 
-        self.launching_patterns = [
+        return [
             # [0.1, [225, 135, 45, -45]],
             [0.1, get_all_range(90, 45)],
             [2, get_all_range(90, 0)],
@@ -433,28 +754,29 @@ class PointEnemy(Enemy):
             # [1000, 'all'],
             # [1000, 'all'],
         ]
-        self.current_timestamp = 0
 
+    @staticmethod
+    def get_enemy_launch_patterns(pos):
         def get_enemies_list(_time=0.0, _dt=0.0, _type='a', beats=1):
             if _type == 'a':
                 return [[
                     _time + i * _dt,
                     PointSpreadBullet,
-                    [self.pos, self.pos, self.pos, self.pos],
+                    [pos, pos, pos, pos],
                     [(WIDTH / 4, HEIGHT / 4), (WIDTH * 3 / 4, HEIGHT / 4), (WIDTH * 3 / 4, HEIGHT * 3 / 4), (WIDTH / 4, HEIGHT * 3 / 4)]
                 ] for i in range(beats)]
             elif _type == 'b':
                 return [[
                     _time + i * _dt,
                     PointSpreadBullet,
-                    [self.pos, self.pos, self.pos, self.pos],
+                    [pos, pos, pos, pos],
                     [(WIDTH / 2, HEIGHT / 4), (WIDTH * 3 / 4, HEIGHT / 2), (WIDTH / 2, HEIGHT * 3 / 4), (WIDTH / 4, HEIGHT / 2)]
                 ] for i in range(beats)]
             elif _type == 'c':
                 return [[
                     _time + i * _dt,
                     PointSpreadBullet,
-                    [self.pos] * 8,
+                    [pos] * 8,
                     [(WIDTH / 4, HEIGHT / 4), (WIDTH * 3 / 4, HEIGHT / 4), (WIDTH * 3 / 4, HEIGHT * 3 / 4), (WIDTH / 4, HEIGHT * 3 / 4),
                      (WIDTH / 2, HEIGHT / 4), (WIDTH * 3 / 4, HEIGHT / 2), (WIDTH / 2, HEIGHT * 3 / 4), (WIDTH / 4, HEIGHT / 2)]
                 ] for i in range(beats)]
@@ -467,7 +789,7 @@ class PointEnemy(Enemy):
                     [
                         initial_time + i * dt,
                         PointSpreadBullet,
-                        [self.pos],
+                        [pos],
                         [(WIDTH * (i + 1) / (count + 1), 50)]
                     ] for i in range(count)
                 ]
@@ -476,7 +798,7 @@ class PointEnemy(Enemy):
                     [
                         initial_time + i * dt,
                         PointSpreadBullet,
-                        [self.pos],
+                        [pos],
                         [(WIDTH * (i + 1) / (count + 1), HEIGHT - 25)]
                     ] for i in range(count)
                 ]
@@ -485,7 +807,7 @@ class PointEnemy(Enemy):
                     [
                         initial_time + i * dt,
                         PointSpreadBullet,
-                        [self.pos],
+                        [pos],
                         [(25, HEIGHT * (i + 1) / (count + 1))]
                     ] for i in range(count)
                 ]
@@ -494,14 +816,14 @@ class PointEnemy(Enemy):
                     [
                         initial_time + i * dt,
                         PointSpreadBullet,
-                        [self.pos],
+                        [pos],
                         [(WIDTH - 25, HEIGHT * (i + 1) / (count + 1))]
                     ] for i in range(count)
                 ]
             else:
                 return []
 
-        self.enemy_launch_patterns = [
+        return [
             # [timestamp, enemy_type, [pos_list], [target_pos_list]]
             *get_enemies_list(59, _dt=1.8, _type='a', beats=4),
             *get_enemies_list(59 + 1.8 * 4 + 0.1, _dt=1.8, _type='b', beats=4),
@@ -510,25 +832,25 @@ class PointEnemy(Enemy):
             [
                 103,
                 PointSpreadBullet,
-                [self.pos] * 3,
+                [pos] * 3,
                 [(WIDTH / 4, HEIGHT / 4), (WIDTH / 2, HEIGHT / 4), (WIDTH * 3 / 4, HEIGHT / 4)]
             ],
             [
                 105,
                 PointSpreadBullet,
-                [self.pos] * 3,
+                [pos] * 3,
                 [(WIDTH / 4, HEIGHT * 3 / 4), (WIDTH / 2, HEIGHT * 3 / 4), (WIDTH * 3 / 4, HEIGHT * 3 / 4)]
             ],
             [
                 107,
                 PointSpreadBullet,
-                [self.pos] * 3,
+                [pos] * 3,
                 [(WIDTH / 4, HEIGHT / 4), (WIDTH / 4, HEIGHT / 2), (WIDTH / 4, HEIGHT * 3 / 4)]
             ],
             [
                 109,
                 PointSpreadBullet,
-                [self.pos] * 3,
+                [pos] * 3,
                 [(WIDTH * 3 / 4, HEIGHT / 4), (WIDTH * 3 / 4, HEIGHT / 2), (WIDTH * 3 / 4, HEIGHT * 3 / 4)]
             ],
 
@@ -540,10 +862,6 @@ class PointEnemy(Enemy):
 
             *get_enemy_list_beats(117.1, dt=0.1, _type='right', count=7),
         ]
-        self.current_enemy_timestamp = 0
-
-        self.k = 0
-        self.k1 = 0
 
     @property
     def pos(self):
@@ -552,12 +870,12 @@ class PointEnemy(Enemy):
     def use_ai(self, player: 'Player'):
         super().use_ai(player)
         self.r *= 0.95
-        self.x += math.sin(time.time() * self.k) * self.k1
-        self.y += math.cos(time.time() * self.k) * self.k1
+        self.x += math.sin(now() * self.k) * self.k1
+        self.y += math.cos(now() * self.k) * self.k1
         self.r = clamp(self.r, 10, 20)
         # if self.phase_timer.tick:
         #     self.phase += 1
-        _bullets = []
+        _bullets = 0
         _enemies = []
         # try:
         #     if Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK) > Globals.get(TOTAL_DURATION_OF_SOUNDTRACK):
@@ -565,82 +883,26 @@ class PointEnemy(Enemy):
         #         self.alive = False
         # except TypeError:
         #     pass
-        try:
-            if Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK) > self.launching_patterns[self.current_timestamp][0]:
-                if self.launching_patterns[self.current_timestamp][1] == 'all':
-                    for i in range(0, 360, 30):
-                        dx = cos(radians(i))
-                        dy = sin(radians(i))
-                        try:
-                            v = self.launching_patterns[self.current_timestamp][2]
-                            dx *= v
-                            dy *= v
-                        except IndexError:
-                            pass
-                        _bullets.append(
-                            PointBullet(self.x, self.y, dx, dy)
-                        )
-                else:
-                    if self.launching_patterns[self.current_timestamp][1] == 'move':
-                        self.k = 5
-                        self.k1 = 2
-                    else:
-                        for i in self.launching_patterns[self.current_timestamp][1]:
-                            dx = cos(radians(i))
-                            dy = sin(radians(i))
-                            try:
-                                v = self.launching_patterns[self.current_timestamp][2]
-                                dx *= v
-                                dy *= v
-                            except IndexError:
-                                pass
-                            _bullets.append(
-                                PointBullet(self.x, self.y, dx, dy)
-                            )
-                self.current_timestamp += 1
-                _c = 0
-                # print(Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK))
-                for i in self.launching_patterns:
-                    if Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK) > i[0]:
-                        _c += 1
-                        continue
-                    else:
-                        # _c = self.launching_patterns.index(i)
-                        break
-                # if self.current_timestamp != _c:
-                #     _bullets.clear()
-                self.current_timestamp = _c
-        except IndexError:
-            pass
+        elapsed = Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK)
+        pool = self.object_manager.point_bullets
+        for pattern in self.launch_schedule.due(elapsed):
+            v = pattern[2] if len(pattern) > 2 else 1
+            if pattern[1] == 'all':
+                _bullets += pool.spawn_angles(self.x, self.y, range(0, 360, 30), v)
+            elif pattern[1] == 'move':
+                self.k = 5
+                self.k1 = 2
+            else:
+                _bullets += pool.spawn_angles(self.x, self.y, pattern[1], v)
 
         if _bullets:
-            self.object_manager.add_multiple(_bullets)
             self.r = 20
 
-        # print(self.current_enemy_timestamp)
-        try:
-            curr = self.enemy_launch_patterns[self.current_enemy_timestamp]
-            if Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK) > curr[0]:
-                for i in range(len(curr[2])):
-                    pos = curr[2][i]
-                    target_pos = curr[3][i]
-                    _enemies.append(
-                        curr[1](pos, target_pos)
-                    )
-                self.current_enemy_timestamp += 1
-                _c = 0
-                for i in self.enemy_launch_patterns:
-                    if Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK) > i[0]:
-                        _c += 1
-                        continue
-                    else:
-                        # _c = self.enemy_launch_patterns.index(i)
-                        break
-                if self.current_enemy_timestamp != _c:
-                    _enemies.clear()
-                self.current_enemy_timestamp = _c
-        except IndexError:
-            pass
+        for curr in self.enemy_schedule.due(elapsed):
+            for pos, target_pos in zip(curr[2], curr[3]):
+                _enemies.append(
+                    curr[1].spawn(pos, target_pos)
+                )
 
         if _enemies:
             self.object_manager.add_multiple(_enemies)
@@ -652,7 +914,13 @@ class PointEnemy(Enemy):
 
 
 class LineEnemy(Enemy):
-    def __init__(self, x=WIDTH // 2, y=HEIGHT // 2):
+    timeline = 'line'
+    __slots__ = (
+        'x', 'y', 'r', 'phase', 'phase_timer', 'bullet_timer', 'ray_timer', 'offset', 'k', 'k1',
+        'launching_patterns', 'enemy_launch_patterns', 'launch_schedule', 'enemy_schedule'
+    )
+
+    def __init__(self, x=WIDTH // 2, y=HEIGHT // 2, patterns=None):
         super().__init__()
         self.x = x
         self.y = y
@@ -667,6 +935,15 @@ class LineEnemy(Enemy):
         self.k = 0
         self.k1 = 0
 
+        # patterns -> (launching_patterns, enemy_launch_patterns) shared by a scene across resets
+        self.launching_patterns, self.enemy_launch_patterns = patterns or self.load_patterns(self.pos)
+        self.launch_schedule = PatternSchedule(self.launching_patterns)
+        self.enemy_schedule = PatternSchedule(self.enemy_launch_patterns)
+        self.launch_schedule.seek(Globals.get(CHECKPOINT) or 0)
+        self.enemy_schedule.seek(Globals.get(CHECKPOINT) or 0)
+
+    @staticmethod
+    def get_launching_patterns():
         def get_one_by_one(initial_time=0.0, dt=1.0, offset=1, vel=3, beats=1, _type=LineBullet1, initial_offset=0):
             # _offset = random.randint(-10, 10)
             _offset = initial_offset
@@ -679,7 +956,7 @@ class LineEnemy(Enemy):
                 [initial_time + i * dt, _type, range(offset * i, 360 + offset * i, step), vel] for i in range(beats)
             ]
 
-        self.launching_patterns = [
+        return [
             # [1, LineBullet1, [10, 20, 30], 3],
             *get_one_by_one(0, 0.4, offset=20, vel=5, beats=15),
             *get_one_by_one(6, 0.05, offset=20, vel=5, beats=19),
@@ -729,15 +1006,15 @@ class LineEnemy(Enemy):
             *get_range_one_by_one(102.3, 0.425, step=15, offset=10, vel=5, beats=1),
         ]
 
-        # self.launching_patterns.clear()
-
+    @staticmethod
+    def get_enemy_launch_patterns(pos):
         def get_enemy_list_beats(initial_time=0.0, dt=0.002, _type='bottom', count=2):
             if _type == 'top':
                 return [
                     [
                         initial_time + i * dt,
                         LineSpreadBullet,
-                        [self.pos],
+                        [pos],
                         [(WIDTH * (i + 1) / (count + 1), 25)]
                     ] for i in range(count)
                 ]
@@ -746,7 +1023,7 @@ class LineEnemy(Enemy):
                     [
                         initial_time + i * dt,
                         LineSpreadBullet,
-                        [self.pos],
+                        [pos],
                         [(WIDTH * (i + 1) / (count + 1), HEIGHT - 25)]
                     ] for i in range(count)
                 ]
@@ -755,7 +1032,7 @@ class LineEnemy(Enemy):
                     [
                         initial_time + i * dt,
                         LineSpreadBullet,
-                        [self.pos],
+                        [pos],
                         [(25, HEIGHT * (i + 1) / (count + 1))]
                     ] for i in range(count)
                 ]
@@ -764,16 +1041,16 @@ class LineEnemy(Enemy):
                     [
                         initial_time + i * dt,
                         LineSpreadBullet,
-                        [self.pos],
+                        [pos],
                         [(WIDTH - 25, HEIGHT * (i + 1) / (count + 1))]
                     ] for i in range(count)
                 ]
             else:
                 return []
 
-        self.enemy_launch_patterns = [
-            [27.5, LineSpreadBullet, [self.pos], [(150, 150)]],
-            [29, LineSpreadBullet, [self.pos], [(WIDTH - 150, 150)]],
+        return [
+            [27.5, LineSpreadBullet, [pos], [(150, 150)]],
+            [29, LineSpreadBullet, [pos], [(WIDTH - 150, 150)]],
 
             *get_enemy_list_beats(31, dt=0.1, _type='top', count=5),
             # *get_enemy_list_beats(33, dt=0.1, _type='bottom', count=5),
@@ -801,9 +1078,6 @@ class LineEnemy(Enemy):
             *get_enemy_list_beats(90.5, dt=0.2, _type='right', count=10),
         ]
 
-        self.current_enemy_timestamp = 0
-        self.current_timestamp = 0
-
     @property
     def pos(self):
         return self.x, self.y
@@ -811,98 +1085,52 @@ class LineEnemy(Enemy):
     def launch_ray(self, player: Player = None):
         if player:
             self.object_manager.add(
-                LineRay(self.x, self.y, player.x, player.y)
+                LineRay.spawn(self.x, self.y, player.x, player.y)
             )
 
     def use_ai(self, player: 'Player'):
         super().use_ai(player)
         self.r *= 0.95
-        self.x += math.sin(time.time() * self.k) * self.k1
-        self.y += math.cos(time.time() * self.k) * self.k1
+        self.x += math.sin(now() * self.k) * self.k1
+        self.y += math.cos(now() * self.k) * self.k1
         self.r = clamp(self.r, 10, 20)
         # if self.phase_timer.tick:
         #     self.phase += 1
         _bullets = []
         _enemies = []
-        try:
-            if Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK) > self.launching_patterns[self.current_timestamp][0]:
-                if self.launching_patterns[self.current_timestamp][2] == 'all':
-                    for i in range(0, 360, 30):
-                        dx = cos(radians(i))
-                        dy = sin(radians(i))
-                        try:
-                            v = self.launching_patterns[self.current_timestamp][2]
-                            dx *= v
-                            dy *= v
-                        except IndexError:
-                            pass
-                        _bullets.append(
-                            self.launching_patterns[self.current_timestamp][1](self.x, self.y, dx, dy)
-                        )
-                else:
-                    if self.launching_patterns[self.current_timestamp][2] == 'move':
-                        self.k = 5
-                        self.k1 = 2
-                    elif self.launching_patterns[self.current_timestamp][2] == 'line_ray':
-                        self.launch_ray(player)
-                    else:
-                        for i in self.launching_patterns[self.current_timestamp][2]:
-                            dx = cos(radians(i))
-                            dy = sin(radians(i))
-                            try:
-                                v = self.launching_patterns[self.current_timestamp][3]
-                                dx *= v
-                                dy *= v
-                            except IndexError:
-                                pass
-                            _bullets.append(
-                                self.launching_patterns[self.current_timestamp][1](self.x, self.y, dx, dy, length=15, speed=1)
-                                # LineBullet2((self.x, self.y), pygame.Vector2(1, 1))
-                            )
-                self.current_timestamp += 1
-                _c = 0
-                # print(Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK))
-                for i in self.launching_patterns:
-                    if Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK) > i[0]:
-                        _c += 1
-                        continue
-                    else:
-                        # _c = self.launching_patterns.index(i)
-                        break
-                # if self.current_timestamp != _c:
-                #     _bullets.clear()
-                self.current_timestamp = _c
-        except IndexError:
-            pass
+        elapsed = Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK)
+        for pattern in self.launch_schedule.due(elapsed):
+            v = pattern[3] if len(pattern) > 3 else 1
+            if pattern[2] == 'all':
+                for i in range(0, 360, 30):
+                    dx = cos(radians(i)) * v
+                    dy = sin(radians(i)) * v
+                    _bullets.append(
+                        pattern[1].spawn(self.x, self.y, dx, dy)
+                    )
+            elif pattern[2] == 'move':
+                self.k = 5
+                self.k1 = 2
+            elif pattern[2] == 'line_ray':
+                self.launch_ray(player)
+            else:
+                for i in pattern[2]:
+                    dx = cos(radians(i)) * v
+                    dy = sin(radians(i)) * v
+                    _bullets.append(
+                        pattern[1].spawn(self.x, self.y, dx, dy, length=15, speed=1)
+                        # LineBullet2((self.x, self.y), pygame.Vector2(1, 1))
+                    )
 
         if _bullets:
             self.object_manager.add_multiple(_bullets)
             self.r = 20
 
-        # print(self.current_enemy_timestamp)
-        try:
-            curr = self.enemy_launch_patterns[self.current_enemy_timestamp]
-            if Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK) > curr[0]:
-                for i in range(len(curr[2])):
-                    pos = curr[2][i]
-                    target_pos = curr[3][i]
-                    _enemies.append(
-                        curr[1](pos, target_pos)
-                    )
-                self.current_enemy_timestamp += 1
-                _c = 0
-                for i in self.enemy_launch_patterns:
-                    if Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK) > i[0]:
-                        _c += 1
-                        continue
-                    else:
-                        # _c = self.enemy_launch_patterns.index(i)
-                        break
-                if self.current_enemy_timestamp != _c:
-                    _enemies.clear()
-                self.current_enemy_timestamp = _c
-        except IndexError:
-            pass
+        for curr in self.enemy_schedule.due(elapsed):
+            for pos, target_pos in zip(curr[2], curr[3]):
+                _enemies.append(
+                    curr[1].spawn(pos, target_pos)
+                )
 
         if _enemies:
             self.object_manager.add_multiple(_enemies)
@@ -917,12 +1145,15 @@ class LineEnemy(Enemy):
 
 
 class QuadrilateralEnemy(Enemy):
-    pass
+    __slots__ = ()
 
 
 class PointClicked(BaseObject):
-    def __init__(self, x, y, initial_r=0):
-        super().__init__()
+    pooled = True
+    __slots__ = ('x', 'y', 'r')
+
+    def reset(self, x, y, initial_r=0):
+        super().reset()
         self.x = x
         self.y = y
         self.r = initial_r
@@ -940,26 +1171,39 @@ class PointClicked(BaseObject):
 
 
 class TriangleBullet1(BaseObject):
-    def __init__(self, x=WIDTH // 2, y=HEIGHT // 2, dx=1.0, dy=1.0, speed=1.0, length=15):
-        super().__init__()
+    collides = True
+    pooled = True
+    __slots__ = ('x', 'y', 'angle', 'length', 'dx', 'dy', 'sprite', 'shape')
+
+    def reset(self, x=WIDTH // 2, y=HEIGHT // 2, dx=1.0, dy=1.0, speed=1.0, length=15):
+        super().reset()
         self.x = x
         self.y = y
         self.angle = math.degrees(math.atan2(dy, dx)) + 90
         self.length = length
         self.dx = dx * speed
         self.dy = dy * speed
+        self.sprite = None
+        # the angle never changes, only the position is added every frame
+        self.shape = triangle_shape(length, self.angle)
 
     def check_collision(self, player: 'Player'):
-        points = get_triangle(self.length, self.pos, self.angle)
-        for i in range(len(points)):
-            if player.rect.clipline(points[i % 3], points[(i + 1) % 3]):
-                return True
-        return False
+        a, b, c = self.points
+        clipline = player.rect.clipline
+        return bool(clipline(a, b) or clipline(b, c) or clipline(c, a))
+
+    def get_bounds(self):
+        # every vertex is self.length away from the centre
+        return self.x - self.length, self.y - self.length, self.x + self.length, self.y + self.length
 
     @property
     def pos(self):
         return self.x, self.y
 
+    @property
+    def points(self):
+        return translate_triangle(self.shape, (self.x, self.y))
+
     def update(self, events: list[pygame.event.Event]):
         self.x += self.dx
         self.y += self.dy
@@ -967,13 +1211,23 @@ class TriangleBullet1(BaseObject):
             self.alive = False
 
     def draw(self, surf: pygame.Surface):
-        draw_triangle(surf, self.pos, length=self.length, angle=self.angle)
-        draw_triangle(surf, self.pos, color=(255, 0, 0), length=self.length, angle=self.angle, width=2)
+        points = self.points
+        pygame.draw.polygon(surf, 'white', points)
+        pygame.draw.polygon(surf, (255, 0, 0), points, width=2)
+
+    def get_sprite(self):
+        if self.sprite is None:
+            self.sprite = sprite_cache.get('triangle', self.length, (255, 0, 0), self.angle)
+        sprite, (ox, oy) = self.sprite
+        return sprite, (self.x - ox, self.y - oy)
 
 
 class TriangleLauncherOneTime(BaseObject):
-    def __init__(self, pos, target_pos, length=15):
-        super().__init__()
+    pooled = True
+    __slots__ = ('pos', 'target_pos', 'angle', 'length')
+
+    def reset(self, pos, target_pos, length=15):
+        super().reset()
         self.pos = pygame.Vector2(pos)
         self.target_pos = pygame.Vector2(target_pos)
         self.angle = 0
@@ -994,7 +1248,7 @@ class TriangleLauncherOneTime(BaseObject):
             for i in range(offset, 360 + offset, 30):
                 dx = cos(radians(i)) * speed
                 dy = sin(radians(i)) * speed
-                _bullets.append(TriangleBullet1(self.pos.x, self.pos.y, dx, dy, length=10, speed=3))
+                _bullets.append(TriangleBullet1.spawn(self.pos.x, self.pos.y, dx, dy, length=10, speed=3))
             self.object_manager.add_multiple(_bullets)
             self.alive = False
 
@@ -1004,7 +1258,13 @@ class TriangleLauncherOneTime(BaseObject):
 
 
 class TriangleEnemy(Enemy):
-    def __init__(self):
+    timeline = 'triangle'
+    __slots__ = (
+        'x', 'y', 'angle', 'done', 'length', 'r', 'max_r', 'min_r', 'launching_patterns', 'enemy_launch_patterns',
+        'launch_schedule', 'enemy_schedule', 'angle_k', 'jitter'
+    )
+
+    def __init__(self, patterns=None):
         super().__init__()
         self.x = WIDTH // 2
         self.y = HEIGHT // 2
@@ -1016,15 +1276,27 @@ class TriangleEnemy(Enemy):
         self.max_r = 35
         self.min_r = 20
 
+        # patterns -> (launching_patterns, enemy_launch_patterns) shared by a scene across resets
+        self.launching_patterns, self.enemy_launch_patterns = patterns or self.load_patterns(self.pos)
+        self.launch_schedule = PatternSchedule(self.launching_patterns)
+        self.enemy_schedule = PatternSchedule(self.enemy_launch_patterns)
+        self.launch_schedule.seek(Globals.get(CHECKPOINT) or 0)
+        self.enemy_schedule.seek(Globals.get(CHECKPOINT) or 0)
+
+        self.angle_k = 0
+        self.jitter = {}
+
+    @staticmethod
+    def get_launching_patterns():
         def get_triangle_beats(initial_time, dt=1.0, step=30, offset=10, speed=1.0, beats=1):
             return [
                 [initial_time + i * dt, TriangleBullet1, range(offset * i, 360 + offset * i, step), speed] for i in range(beats)
             ]
 
         def get_one_by_one(initial_time, dt=1.0, step=30, speed=1.0, beats=1, offset_range=0):
-            offset = random.randint(-offset_range, offset_range)
+            # the whole group shares one random offset, rolled when it first fires (see get_jitter)
             return [
-                [initial_time + i * dt, TriangleBullet1, [step * i + offset], speed] for i in range(beats)
+                [initial_time + i * dt, TriangleBullet1, [step * i], speed, initial_time, offset_range] for i in range(beats)
             ]
 
         def get_all_range(step=0, offset=0):
@@ -1037,7 +1309,7 @@ class TriangleEnemy(Enemy):
                 _list.append(a)
             return _list
 
-        self.launching_patterns = [
+        return [
             # [1, TriangleBullet1, [1, 2, 3], 3],
             *get_triangle_beats(0, dt=0.9, step=45, offset=30, speed=3, beats=2),
             *get_triangle_beats(2, dt=0.9, step=45, offset=30, speed=3, beats=2),
@@ -1092,8 +1364,8 @@ class TriangleEnemy(Enemy):
 
         ]
 
-        # self.launching_patterns.clear()
-
+    @staticmethod
+    def get_enemy_launch_patterns(pos):
         def get_enemy_launchers_one_by_one(initial_time, dt, _type='top', count=2):
             offset = 50
             if _type == 'top':
@@ -1101,7 +1373,7 @@ class TriangleEnemy(Enemy):
                     [
                         initial_time + i * dt,
                         TriangleLauncherOneTime,
-                        [self.pos],
+                        [pos],
                         [(WIDTH * (i + 1) / (count + 1), offset)]
                     ] for i in range(count)
                 ]
@@ -1110,7 +1382,7 @@ class TriangleEnemy(Enemy):
                     [
                         initial_time + i * dt,
                         TriangleLauncherOneTime,
-                        [self.pos],
+                        [pos],
                         [(WIDTH * (i + 1) / (count + 1), HEIGHT - offset)]
                     ] for i in range(count)
                 ]
@@ -1119,7 +1391,7 @@ class TriangleEnemy(Enemy):
                     [
                         initial_time + i * dt,
                         TriangleLauncherOneTime,
-                        [self.pos],
+                        [pos],
                         [(offset, HEIGHT * (i + 1) / (count + 1))]
                     ] for i in range(count)
                 ]
@@ -1128,14 +1400,14 @@ class TriangleEnemy(Enemy):
                     [
                         initial_time + i * dt,
                         TriangleLauncherOneTime,
-                        [self.pos],
+                        [pos],
                         [(WIDTH - offset, HEIGHT * (i + 1) / (count + 1))]
                     ] for i in range(count)
                 ]
             else:
                 return []
 
-        self.enemy_launch_patterns = [
+        return [
             # [1, TriangleLauncherOneTime, [(0, 0)], [(150, 150)]],
             # [5, TriangleLauncherOneTime, [(0, 0)], [(150, 150)]],
             *get_enemy_launchers_one_by_one(40, 0.2, 'top', 5),
@@ -1145,11 +1417,6 @@ class TriangleEnemy(Enemy):
 
         ]
 
-        self.current_enemy_timestamp = 0
-        self.current_timestamp = 0
-
-        self.angle_k = 0
-
     @property
     def pos(self):
         return self.x, self.y
@@ -1158,6 +1425,15 @@ class TriangleEnemy(Enemy):
     def points(self):
         return get_triangle(self.length, self.pos, self.angle)
 
+    def get_jitter(self, pattern):
+        # pattern -> [time, bullet, angles, speed, group, offset_range]
+        if len(pattern) < 6:
+            return 0
+        group = pattern[4], pattern[5]
+        if group not in self.jitter:
+            self.jitter[group] = random.randint(-pattern[5], pattern[5])
+        return self.jitter[group]
+
     def use_ai(self, player: 'Player'):
         self.length *= 0.95
         self.length = clamp(self.length, 25, 50)
@@ -1168,90 +1444,46 @@ class TriangleEnemy(Enemy):
 
         _bullets = []
         _enemies = []
-        try:
-            if Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK) > self.launching_patterns[self.current_timestamp][0]:
-                if self.launching_patterns[self.current_timestamp][2] == 'all':
-                    for i in [0, 120, 240]:
-                        i = i - 90 + self.angle
-                        dx = cos(radians(i))
-                        dy = sin(radians(i))
-                        try:
-                            v = self.launching_patterns[self.current_timestamp][3]
-                            dx *= v
-                            dy *= v
-                        except IndexError:
-                            pass
-                        _bullets.append(
-                            self.launching_patterns[self.current_timestamp][1](self.x, self.y, dx, dy)
-                        )
-                else:
-                    if self.launching_patterns[self.current_timestamp][2] == 'rotate':
-                        self.angle_k = 1
-                        # self.k = 5
-                        # self.k1 = 2
-                    elif self.launching_patterns[self.current_timestamp][2] == 'rotate faster':
-                        self.angle_k += 2
-                    else:
-                        for i in self.launching_patterns[self.current_timestamp][2]:
-                            # i = self.angle + 120 * (i - 1) - 90
-                            # i += self.angle
-                            dx = cos(radians(i))
-                            dy = sin(radians(i))
-                            try:
-                                v = self.launching_patterns[self.current_timestamp][3]
-                                dx *= v
-                                dy *= v
-                            except IndexError:
-                                pass
-                            _bullets.append(
-                                self.launching_patterns[self.current_timestamp][1](self.x, self.y, dx, dy, length=10)
-                                # LineBullet2((self.x, self.y), pygame.Vector2(1, 1))
-                            )
-                self.current_timestamp += 1
-                _c = 0
-                # print(Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK))
-                for i in self.launching_patterns:
-                    if Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK) > i[0]:
-                        _c += 1
-                        continue
-                    else:
-                        # _c = self.launching_patterns.index(i)
-                        break
-                # if self.current_timestamp != _c:
-                #     _bullets.clear()
-                self.current_timestamp = _c
-        except IndexError:
-            pass
+        elapsed = Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK)
+        for pattern in self.launch_schedule.due(elapsed):
+            v = pattern[3] if len(pattern) > 3 else 1
+            if pattern[2] == 'all':
+                for i in [0, 120, 240]:
+                    i = i - 90 + self.angle
+                    dx = cos(radians(i)) * v
+                    dy = sin(radians(i)) * v
+                    _bullets.append(
+                        pattern[1].spawn(self.x, self.y, dx, dy)
+                    )
+            elif pattern[2] == 'rotate':
+                self.angle_k = 1
+                # self.k = 5
+                # self.k1 = 2
+            elif pattern[2] == 'rotate faster':
+                self.angle_k += 2
+            else:
+                offset = self.get_jitter(pattern)
+                for i in pattern[2]:
+                    # i = self.angle + 120 * (i - 1) - 90
+                    # i += self.angle
+                    i += offset
+                    dx = cos(radians(i)) * v
+                    dy = sin(radians(i)) * v
+                    _bullets.append(
+                        pattern[1].spawn(self.x, self.y, dx, dy, length=10)
+                        # LineBullet2((self.x, self.y), pygame.Vector2(1, 1))
+                    )
 
         if _bullets:
             self.object_manager.add_multiple(_bullets)
             self.length = 50
             self.r = self.max_r
 
-        # print(self.current_enemy_timestamp)
-        try:
-            curr = self.enemy_launch_patterns[self.current_enemy_timestamp]
-            if Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK) > curr[0]:
-                for i in range(len(curr[2])):
-                    pos = curr[2][i]
-                    target_pos = curr[3][i]
-                    _enemies.append(
-                        curr[1](pos, target_pos)
-                    )
-                self.current_enemy_timestamp += 1
-                _c = 0
-                for i in self.enemy_launch_patterns:
-                    if Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK) > i[0]:
-                        _c += 1
-                        continue
-                    else:
-                        # _c = self.enemy_launch_patterns.index(i)
-                        break
-                if self.current_enemy_timestamp != _c:
-                    _enemies.clear()
-                self.current_enemy_timestamp = _c
-        except IndexError:
-            pass
+        for curr in self.enemy_schedule.due(elapsed):
+            for pos, target_pos in zip(curr[2], curr[3]):
+                _enemies.append(
+                    curr[1].spawn(pos, target_pos)
+                )
 
         if _enemies:
             self.object_manager.add_multiple(_enemies)
@@ -1265,10 +1497,71 @@ class TriangleEnemy(Enemy):
         draw_triangle(surf, self.pos, color=(255, 0, 0), length=self.length, angle=self.angle, width=3)
 
 
+class ObjectLayers:
+    """
+    Objects bucketed by z, iterated from the lowest z up and in insertion order within a layer
+    Adding is an append to its layer, dead objects are compacted out in place by live(), nothing is ever sorted
+    """
+
+    def __init__(self):
+        self.layers: dict[int, list[BaseObject]] = {}
+        self.order: list[tuple[int, list[BaseObject]]] = []  # (z, layer) by ascending z
+
+    def __len__(self):
+        return sum(len(layer) for _, layer in self.order)
+
+    def __bool__(self):
+        return any(layer for _, layer in self.order)
+
+    def __iter__(self):
+        for _, layer in self.order:
+            yield from layer
+
+    def add(self, _object: BaseObject):
+        try:
+            self.layers[_object.z].append(_object)
+        except KeyError:
+            self.layers[_object.z] = [_object]
+            self.order = sorted(self.layers.items(), key=lambda i: i[0])
+
+    def extend(self, _objects: list[BaseObject]):
+        for i in _objects:
+            self.add(i)
+
+    def clear(self):
+        for _, layer in self.order:
+            for i in layer:
+                if i.pooled:
+                    object_pool.release(i)
+            layer.clear()
+
+    def live(self):
+        # yields the live objects, dropping dead ones from their layers as it goes, must be run to the end
+        moved = []
+        for z, layer in self.order:
+            j = 0
+            for i in layer:
+                if not i.alive:
+                    if i.pooled:
+                        object_pool.release(i)
+                    continue
+                if i.z != z:
+                    moved.append(i)
+                else:
+                    layer[j] = i
+                    j += 1
+                yield i
+            del layer[j:]
+        for i in moved:
+            self.add(i)
+
+
 class ObjectManager:
     def __init__(self):
-        self.objects: list[BaseObject] = []
+        self.objects = ObjectLayers()
         self._to_add: list[BaseObject] = []
+        self.point_bullets = PointBulletPool()
+        self.broad_phase = SpatialHash()
         self.player = None
         self.player_pos = [0, 0]
         self.collision_enabled = True
@@ -1278,15 +1571,28 @@ class ObjectManager:
         for i in self.objects:
             if type(i) == instance:
                 c += 1
+        if instance is PointBullet:
+            c += len(self.point_bullets)
         return c
 
+    def get_object_counts(self):
+        # class name -> live objects, for the profiler
+        counts = Counter(type(i).__name__ for i in self.objects)
+        if self.point_bullets:
+            counts['PointBullet'] += len(self.point_bullets)
+        if self.player:
+            counts['Player'] += 1
+        return counts
+
     def clear_only_objects(self):
         self._to_add.clear()
         self.objects.clear()
+        self.point_bullets.clear()
 
     def clear(self):
         self._to_add.clear()
         self.objects.clear()
+        self.point_bullets.clear()
         if self.player:
             self.player_pos = [self.player.x, self.player.y]
         self.player = None
@@ -1298,6 +1604,18 @@ class ObjectManager:
         else:
             self.player = Player(*self.player_pos)
 
+    def check_collisions(self):
+        # grid broad phase around the player, then the usual per-object narrow phase
+        player = self.player
+        # objects that died during the last update are only dropped by the next one
+        self.broad_phase.build(i for i in self.objects if i.collides and i.alive)
+        # a couple of pixels of slack since pygame truncates float coordinates
+        rect = player.rect.inflate(4, 4)
+        for i in self.broad_phase.query((rect.left, rect.top, rect.right, rect.bottom)):
+            if i.check_collision(player):
+                return True
+        return False
+
     def add(self, _object: BaseObject):
         _object.object_manager = self
         self._to_add.append(_object)
@@ -1310,25 +1628,48 @@ class ObjectManager:
         if self._to_add:
             self.objects.extend(self._to_add)
             self._to_add.clear()
-        self.objects = [i for i in self.objects if i.alive]
-        self.objects.sort(key=attrgetter('z'))
+        self.point_bullets.flush()
         # print(self.objects)
         # print(self.get_object_count(Player))
-        for i in self.objects:
+        if self.collision_enabled and self.player:
+            if profiler.measure('collision', self.check_collisions):
+                self.player.alive = False
+        for i in self.objects.live():
             # i.update(events)
-            # TODO collisions
-            if self.collision_enabled:
-                if i.check_collision(self.player):
-                    self.player.alive = False
             if isinstance(i, Enemy):
                 i.use_ai(self.player)
             else:
                 i.update(events)
+        if self.collision_enabled:
+            if profiler.measure('collision', self.point_bullets.check_collision, self.player):
+                self.player.alive = False
+        self.point_bullets.update(events)
         if self.player:
             self.player.update(events)
 
     def draw(self, surf: pygame.Surface):
-        for i in self.objects:
-            i.draw(surf)
+        # consecutive sprites go out in one blits call, anything else keeps its draw order
+        batch = []
+        pool_drawn = False
+        for z, layer in self.objects.order:
+            if not pool_drawn and z > self.point_bullets.z:
+                if batch:
+                    surf.blits(batch, doreturn=False)
+                    batch.clear()
+                self.point_bullets.draw(surf)
+                pool_drawn = True
+            for i in layer:
+                sprite = i.get_sprite()
+                if sprite is None:
+                    if batch:
+                        surf.blits(batch, doreturn=False)
+                        batch.clear()
+                    i.draw(surf)
+                else:
+                    batch.append(sprite)
+        if batch:
+            surf.blits(batch, doreturn=False)
+        if not pool_drawn:
+            self.point_bullets.draw(surf)
         if self.player:
             self.player.draw(surf)
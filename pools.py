@@ -0,0 +1,111 @@
+"""
+Recycling of short lived game objects and garbage collector control
+Dead pooled objects go back to a free list of their class and are revived with reset() by spawn(),
+while a level plays the collector is kept away from the objects that live for the whole level
+"""
+
+import gc
+from collections import Counter
+from time import perf_counter
+
+
+class ObjectPool:
+    """
+    Free lists of dead objects per class, at most max_size each
+    """
+
+    def __init__(self, max_size=2048):
+        self.max_size = max_size
+        self.free: dict[type, list] = {}
+        self.allocated = Counter()  # class name -> objects constructed
+        self.recycled = Counter()  # class name -> objects revived from a free list
+
+    def spawn(self, cls, *args, **kwargs):
+        try:
+            obj = self.free[cls].pop()
+        except (KeyError, IndexError):
+            self.allocated[cls.__name__] += 1
+            return cls(*args, **kwargs)
+        self.recycled[cls.__name__] += 1
+        obj.reset(*args, **kwargs)
+        return obj
+
+    def release(self, obj):
+        try:
+            free = self.free[type(obj)]
+        except KeyError:
+            free = self.free[type(obj)] = []
+        if len(free) < self.max_size:
+            free.append(obj)
+
+    def clear(self):
+        self.free.clear()
+
+    def stats(self):
+        allocated = sum(self.allocated.values())
+        recycled = sum(self.recycled.values())
+        return {
+            'allocated': allocated,
+            'recycled': recycled,
+            'free': sum(len(i) for i in self.free.values()),
+            'reuse_rate': recycled / (allocated + recycled) if allocated + recycled else 0.0,
+        }
+
+
+class GCGuard:
+    """
+    Keeps the cyclic garbage collector out of the way during levels
+    enter() collects once, freezes everything alive so far (scenes, patterns, sprites) out of the
+    collector's reach and raises the generation 0 threshold, exit() undoes it, stats() has the pauses
+    """
+
+    def __init__(self, threshold=(10000, 20, 20)):
+        self.threshold = threshold
+        self.saved = None  # thresholds before enter()
+        self.pauses = []
+        self.start = 0.0
+
+    @property
+    def active(self):
+        return self.saved is not None
+
+    def __call__(self, phase, info):
+        # gc.callbacks hook
+        if phase == 'start':
+            self.start = perf_counter()
+        else:
+            self.pauses.append(perf_counter() - self.start)
+
+    def enter(self):
+        if self.active:
+            return
+        gc.collect()
+        gc.freeze()
+        self.saved = gc.get_threshold()
+        gc.set_threshold(*self.threshold)
+        self.pauses.clear()
+        gc.callbacks.append(self)
+
+    def exit(self, report=False):
+        if not self.active:
+            return
+        gc.callbacks.remove(self)
+        gc.set_threshold(*self.saved)
+        self.saved = None
+        gc.unfreeze()
+        if report:
+            stats = self.stats()
+            print(f'gc during level: {stats["collections"]} collections, {stats["total"] * 1000:.1f} ms total, '
+                  f'max pause {stats["max_pause"] * 1000:.2f} ms')
+
+    def stats(self):
+        # collections during the current (or last) level
+        return {
+            'collections': len(self.pauses),
+            'total': sum(self.pauses),
+            'max_pause': max(self.pauses, default=0.0),
+        }
+
+
+object_pool = ObjectPool()
+gc_guard = GCGuard()
@@ -0,0 +1,163 @@
+"""
+Per frame timings of the game subsystems
+F3 toggles the overlay, python main.py --profile session.csv (or .json) records every frame and saves it on exit
+"""
+
+import atexit
+import csv
+import json
+from collections import Counter, deque
+from time import perf_counter
+
+import pygame
+
+SECTIONS = (
+    'menu.update',
+    'menu.draw',
+    'object_manager.update',
+    'collision',  # also counted in object_manager.update
+    'object_manager.draw',
+    'transition_manager',
+    'subtitle_manager',
+    'display.update',
+)
+
+
+def percentile(values, p):
+    # nearest rank percentile of an already sorted list
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, round(p / 100 * (len(values) - 1)))]
+
+
+class Profiler:
+    """
+    Rolling timings (last `window` frames) of every section plus the whole frame
+    """
+
+    def __init__(self, window=300):
+        self.window = window
+        self.visible = False
+        self.path = None  # session export path, set by record()
+        self.current = dict.fromkeys(SECTIONS, 0.0)
+        self.history = {i: deque(maxlen=window) for i in SECTIONS + ('frame',)}
+        self.counts = Counter()
+        self.session = []
+        self.frame_start = perf_counter()
+        self.frame_index = 0
+        self.stats = {}
+        self.sound = {}  # SoundManager.stats() of the last frame
+        self.logs = []  # (frame, name, stats) reported with log(), part of a .json export
+        self.font = None  # pygame's default font, the game font has no underscores
+
+    @property
+    def active(self):
+        return self.visible or self.path is not None
+
+    def toggle(self):
+        self.visible = not self.visible
+
+    def record(self, path):
+        self.path = path
+        atexit.register(self.export)
+
+    def measure(self, name, func, *args):
+        start = perf_counter()
+        result = func(*args)
+        self.current[name] += perf_counter() - start
+        return result
+
+    def begin_frame(self):
+        self.frame_start = perf_counter()
+        for i in self.current:
+            self.current[i] = 0.0
+
+    def end_frame(self, object_manager=None, mode='', soundtrack_time=0.0, sound_manager=None):
+        total = perf_counter() - self.frame_start
+        for name, value in self.current.items():
+            self.history[name].append(value)
+        self.history['frame'].append(total)
+        self.frame_index += 1
+        if not self.active:
+            return
+        if object_manager is not None:
+            self.counts = object_manager.get_object_counts()
+        if sound_manager is not None:
+            self.sound = sound_manager.stats()
+        if self.path is not None:
+            self.session.append({
+                'frame': self.frame_index,
+                'mode': mode,
+                'soundtrack_time': round(soundtrack_time or 0.0, 4),
+                'frame_ms': total * 1000,
+                **{i: self.current[i] * 1000 for i in SECTIONS},
+                'objects': dict(self.counts),
+            })
+        if self.visible and (self.frame_index % 15 == 0 or not self.stats):
+            self.stats = self.percentiles()
+
+    def log(self, name, stats: dict):
+        # one off statistics, e.g. of a soundtrack when it stops, printed while profiling
+        if not self.active:
+            return
+        self.logs.append({'frame': self.frame_index, 'name': name, **stats})
+        print(f'{name}: ' + ', '.join(f'{key} {value:.4g}' for key, value in stats.items()))
+
+    def percentiles(self):
+        # section -> (p50, p95, p99) in ms
+        stats = {}
+        for name, values in self.history.items():
+            values = sorted(values)
+            stats[name] = tuple(percentile(values, p) * 1000 for p in (50, 95, 99))
+        return stats
+
+    def draw(self, surf: pygame.Surface):
+        if not self.visible:
+            return
+        if self.font is None:
+            self.font = pygame.font.Font(None, 18)
+        f = self.font
+        rows = [('ms', 'p50', 'p95', 'p99')]
+        for name, values in self.stats.items():
+            rows.append((name, *(f'{i:.2f}' for i in values)))
+        rows.append(('objects', '', '', f'{sum(self.counts.values())}'))
+        for name, count in self.counts.most_common(6):
+            rows.append((f'  {name}', '', '', f'{count}'))
+        if self.sound:
+            rows.append(('sounds played', '', '', f'{self.sound["played"]}'))
+            rows.append(('  dropped / stolen', '', f'{self.sound["dropped"]}', f'{self.sound["stolen"]}'))
+            rows.append(('  cache hits / ms saved', '', f'{self.sound["cache_hits"]}',
+                         f'{self.sound["decode_time_saved"] * 1000:.0f}'))
+        height = f.get_linesize()
+        overlay = pygame.Surface((330, height * len(rows) + 10), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 180))
+        for i, (name, *values) in enumerate(rows):
+            y = 5 + i * height
+            overlay.blit(f.render(name, False, 'white'), (5, y))
+            for x, value in zip((220, 270, 320), values):
+                label = f.render(value, False, 'white')
+                overlay.blit(label, label.get_rect(topright=(x, y)))
+        surf.blit(overlay, (5, 40))
+
+    def export(self, path=None):
+        path = path or self.path
+        if not path or not self.session:
+            return
+        if path.endswith('.json'):
+            with open(path, 'w') as f:
+                json.dump({'sections': SECTIONS, 'frames': self.session, 'logs': self.logs}, f)
+        else:
+            classes = sorted({name for row in self.session for name in row['objects']})
+            with open(path, 'w', newline='') as f:
+                writer = csv.writer(f)
+                writer.writerow(['frame', 'mode', 'soundtrack_time', 'frame_ms', *SECTIONS, *classes])
+                for row in self.session:
+                    writer.writerow([
+                        row['frame'], row['mode'], row['soundtrack_time'], f'{row["frame_ms"]:.4f}',
+                        *(f'{row[i]:.4f}' for i in SECTIONS),
+                        *(row['objects'].get(i, 0) for i in classes)
+                    ])
+        print(f'profile of {len(self.session)} frames saved to {path}')
+
+
+profiler = Profiler()
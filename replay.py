@@ -0,0 +1,97 @@
+"""
+Keyboard input streams for replaying level playthroughs
+Inputs are timed against the soundtrack so a replay stays in sync with the bullet patterns
+
+file format -> json dict
+    level -> str (point, line, triangle)
+    checkpoint -> float (soundtrack time the level started at)
+    inputs -> list [ list [ float (soundtrack time), 'down' | 'up', str (pygame key name) ] ]
+"""
+
+import atexit
+import json
+from operator import itemgetter
+
+import pygame
+
+from config import Globals
+from constants import *
+
+LEVELS = ('point', 'line', 'triangle')
+
+
+class KeyState:
+    """
+    Held keys, indexable by key code like pygame.key.get_pressed()
+    """
+
+    def __init__(self):
+        self.held = set()
+
+    def __getitem__(self, key):
+        return key in self.held
+
+
+class InputScript:
+    def __init__(self, inputs, level='point', checkpoint=0.0):
+        self.level = level
+        self.checkpoint = checkpoint
+        self.inputs = sorted(inputs, key=itemgetter(0))
+        self.cursor = 0
+        self.keys = KeyState()
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data.get('inputs', []), data.get('level', 'point'), data.get('checkpoint', 0.0))
+
+    def events(self, _time):
+        # key events due at soundtrack time _time, also applied to self.keys
+        events = []
+        while self.cursor < len(self.inputs) and self.inputs[self.cursor][0] <= _time:
+            _, action, name = self.inputs[self.cursor]
+            self.cursor += 1
+            key = pygame.key.key_code(name)
+            if action == 'down':
+                self.keys.held.add(key)
+                events.append(pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode='', scancode=0))
+            else:
+                self.keys.held.discard(key)
+                events.append(pygame.event.Event(pygame.KEYUP, key=key, mod=0, unicode='', scancode=0))
+        return events
+
+
+class InputRecorder:
+    """
+    Records the keyboard input of the latest level attempt and saves it on exit
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.level = ''
+        self.checkpoint = 0.0
+        self.inputs = []
+        self.last_time = 0.0
+        atexit.register(self.save)
+
+    def feed(self, events: list[pygame.event.Event], mode):
+        if mode not in LEVELS:
+            return
+        _time = Globals.get(ELAPSED_TIME_FOR_SOUNDTRACK) or 0.0
+        if mode != self.level or _time < self.last_time:
+            # a new attempt started
+            self.level = mode
+            self.checkpoint = Globals.get(CHECKPOINT) or 0.0
+            self.inputs = []
+        self.last_time = _time
+        for e in events:
+            if e.type in (pygame.KEYDOWN, pygame.KEYUP):
+                self.inputs.append([round(_time, 4), 'down' if e.type == pygame.KEYDOWN else 'up', pygame.key.name(e.key)])
+
+    def save(self):
+        if not self.level:
+            return
+        with open(self.path, 'w') as f:
+            json.dump({'level': self.level, 'checkpoint': self.checkpoint, 'inputs': self.inputs}, f)
+        print(f'input recorded to {self.path}')
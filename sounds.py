@@ -1,125 +1,190 @@
-import time
+import threading
+from time import perf_counter
 from typing import Union
 
+from beatgrid import track_duration
 from config import *
 from constants import *
-from utils import map_to_range, clamp
+from envelopes import load_envelope
+from profiler import profiler
+from utils import clamp, game_clock, now
 
 import pygame
 
 
-class SoundManager1:
-    def __init__(self):
-        self.config = {
-            'ping': 'ping.ogg',
-        }
-        self.current = ''
-        for i in self.config.keys():
-            self.config[i] = os.path.abspath(os.path.join(ASSETS, 'sounds', self.config[i]))
-        init = Globals.get(MUSIC_INIT)
-        if init is not None:
-            self.init = Globals.get(MUSIC_INIT)
-        else:
-            self.init = False
-        self.snd = None
-        self.sound: Union[pygame.mixer.Sound, None] = None
-        self._time = time.time()
-
-    def set_sound_value(self):
-        if self.sound:
-            if self.snd is not None:
-                Globals.set(SOUND_VALUE, self.get_sound_value())
-                if pygame.mixer.music.get_busy():
-                    self.sound = None
-                    self.snd = None
+class SoundCache:
+    """
+    Decoded sound effects, preloaded on a background thread where there are threads
+    """
 
-    def update_init(self):
-        init = Globals.get(MUSIC_INIT)
-        if init is not None:
-            self.init = Globals.get(MUSIC_INIT)
+    def __init__(self):
+        self.paths: dict[str, str] = {}
+        self.sounds: dict[str, pygame.mixer.Sound] = {}
+        self.decode_time: dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.thread: Union[threading.Thread, None] = None
+        self.threaded = True  # False once a thread failed to start (pygbag), get() then decodes on first use
+        self.hits = 0
+        self.decode_time_saved = 0.0
 
-    def play_sound(self, sound):
-        # for playing a single sound effect
-        if not self.init:
-            return
-        for i in range(8):
-            if not pygame.mixer.Channel(i).get_busy():
-                self.current = sound
-                pygame.mixer.Channel(i).play(pygame.mixer.Sound(self.config[sound]))
-                # pygame.mixer.Channel(i).set_volume(0)
+    def preload(self, paths: dict[str, str]):
+        self.paths.update(paths)
+        if self.thread is None and self.threaded:
+            try:
+                thread = threading.Thread(target=self.load_all, name='sound-preload', daemon=True)
+                thread.start()
+            except RuntimeError as e:
+                print(f'could not start the sound preload thread ({e}), sounds are decoded on first use')
+                self.threaded = False
                 return
-        if sound == self.current and pygame.mixer.music.get_busy():
-            return
-        self.current = sound
-        # pygame.mixer.music.play()
+            self.thread = thread
 
-    def stop(self):
-        if self.sound:
-            self.sound.stop()
-        self.sound = None
-        self.snd = None
-        pygame.mixer.music.stop()
+    def load_all(self):
+        for name in list(self.paths):
+            self.load(name)
 
-    def fade(self, fade_ms=1):
-        if self.sound:
-            self.sound.fadeout(fade_ms)
+    def load(self, name):
+        with self.lock:
+            # the preload thread may have got there first
+            if name not in self.sounds:
+                start = perf_counter()
+                self.sounds[name] = pygame.mixer.Sound(self.paths[name])
+                self.decode_time[name] = perf_counter() - start
+            return self.sounds[name]
 
-    def reset(self):
-        pass
+    def get(self, name):
+        try:
+            sound = self.sounds[name]
+        except KeyError:
+            return self.load(name)
+        self.hits += 1
+        self.decode_time_saved += self.decode_time[name]
+        return sound
 
-    def play(self, sound):
-        # for playing a bgm track
-        if not self.init:
-            return
-        if self.snd is None:
-            path = os.path.join(ASSETS, 'sounds', f'{sound}.npy')
-            # self.snd = numpy.load(path, allow_pickle=False, fix_imports=False)
-        self.sound = pygame.mixer.Sound(array=self.snd)
-        # pygame.mixer.music.load(os.path.join(ASSETS, 'sounds', f'{sound}.ogg'))
-        # pygame.mixer.music.play()
-        self.sound.play(fade_ms=100)
-        # self.sound_length = self.sound.get_length()
-        # self.sound.stop()
-        self._time = time.time()
-
-    def get_sound_value(self):
-        if self.sound is not None:
-            if self.snd is not None:
-                value = self.snd[self.get_index()]
-                v = clamp(sum(value), 0, 10000 * 2)
-                v = map_to_range(v, 0, 10000 * 2, 0, 10)
-                return v
-            else:
-                return 0
-        else:
-            return 0
-
-    def get_index(self):
-        if self.sound is not None:
-            if self.snd is not None:
-                return round(map_to_range(time.time() - self._time, 0, self.total_length, 0, len(self.snd) - 1))
-            else:
-                return 0
-        else:
-            return 0
 
-    def start_at(self, dt):
-        self._time += dt
-        if self.sound:
-            if self.snd is not None:
-                self.sound.stop()
+class ChannelPool:
+    """
+    Mixer channels for sound effects
+    Voices are tracked with their end time so free channels are known without asking the mixer,
+    when every channel is busy the oldest voice is stolen
+    """
 
-    @property
-    def total_length(self):
-        if self.sound:
-            return self.sound.get_length()
+    def __init__(self, channels=8, limits: dict[str, int] = None):
+        self.channels = [pygame.mixer.Channel(i) for i in range(channels)]
+        self.voices: list[Union[tuple[str, float, float], None]] = [None] * channels  # name, start, end
+        self.limits = limits or {}  # sound name -> max voices playing it at once
+        self.played = 0
+        self.dropped = 0
+        self.stolen = 0
+
+    def play(self, name, sound: pygame.mixer.Sound):
+        t = perf_counter()
+        free = None
+        oldest = None
+        playing = 0
+        for i, voice in enumerate(self.voices):
+            if voice is None or voice[2] <= t:
+                self.voices[i] = None
+                if free is None:
+                    free = i
+                continue
+            if voice[0] == name:
+                playing += 1
+            if oldest is None or voice[1] < self.voices[oldest][1]:
+                oldest = i
+        if playing >= self.limits.get(name, len(self.channels)):
+            self.dropped += 1
+            return False
+        if free is None:
+            free = oldest
+            self.stolen += 1
+        self.channels[free].play(sound)
+        self.voices[free] = (name, t, t + sound.get_length())
+        self.played += 1
+        return True
+
+
+class AudioSync:
+    """
+    Locks soundtrack time to the mixer
+    The game clock is smooth but knows nothing about the audio device, mixer.music.get_pos() is
+    the real position but coarse and jittery. Their difference is sampled a few times a second,
+    smoothed with an alpha-beta filter (offset and drift) and slewed into the soundtrack time,
+    so it stays monotonic and jitter free. Large errors (seeks, stalls) are corrected at once when the
+    mixer is ahead, when it is behind the soundtrack time holds still until the mixer catches up
+    """
+
+    def __init__(self, interval=0.2, alpha=0.2, beta=0.02, slew=0.05, resync=0.25):
+        self.interval = interval  # seconds between mixer samples
+        self.alpha = alpha
+        self.beta = beta
+        self.slew = slew  # max correction per second of game time
+        self.resync = resync  # errors above this are corrected at once
+        self.enabled = True
+        self.reset()
+
+    def reset(self, start=0.0):
+        # start -> soundtrack position music.play() was called with, get_pos() does not include it
+        self.start = start
+        self.offset = 0.0  # filtered audio - game time not yet applied
+        self.drift = 0.0  # change of the error per second
+        self.last_sample = None
+        self.last_update = None
+        self.samples = 0
+        self.error_sum = 0.0
+        self.error_max = 0.0
+        self.resyncs = 0
+
+    def update(self, elapsed, _time):
+        # elapsed -> soundtrack time from the game clock, _time -> game time
+        # returns the correction to add to the soundtrack time this frame
+        if not self.enabled or not game_clock.realtime:
+            self.last_update = _time
+            return 0.0
+        if self.last_sample is None or _time - self.last_sample >= self.interval:
+            pos = pygame.mixer.music.get_pos()
+            if pos >= 0 and pygame.mixer.music.get_busy():
+                error = self.start + pos / 1000 - elapsed
+                dt = _time - self.last_sample if self.last_sample is not None else 0.0
+                predicted = self.offset + self.drift * dt
+                residual = error - predicted
+                if abs(residual) > self.resync:
+                    self.offset = error
+                    self.drift = 0.0
+                    self.resyncs += 1
+                    print(f'audio sync: {error * 1000:+.0f} ms off the mixer, resynced')
+                else:
+                    self.offset = predicted + self.alpha * residual
+                    if dt > 0:
+                        self.drift += self.beta * residual / dt
+                self.samples += 1
+                self.error_sum += abs(error)
+                self.error_max = max(self.error_max, abs(error))
+                self.last_sample = _time
+        dt = _time - self.last_update if self.last_update is not None else 0.0
+        self.last_update = _time
+        if self.offset > self.resync:
+            step = self.offset
+        elif self.offset < -self.resync:
+            # never back, PatternSchedule cursors rely on soundtrack time only moving forward
+            step = max(self.offset, -dt)
         else:
-            return 0
+            limit = self.slew * dt
+            step = clamp(self.offset, -limit, limit)
+        self.offset -= step
+        return step
+
+    def stats(self):
+        return {
+            'samples': self.samples,
+            'error_mean': self.error_sum / self.samples if self.samples else 0.0,
+            'error_max': self.error_max,
+            'drift': self.drift,
+            'resyncs': self.resyncs,
+        }
 
-    @property
-    def elapsed_time(self):
-        if self.sound:
-            return time.time() - self._time
+
+sound_cache = SoundCache()
 
 
 class SoundManager:
@@ -127,11 +192,14 @@ class SoundManager:
         self.config = {
             'ping': 'ping.ogg',
         }
+        self.limits = {
+            'ping': 2,
+        }
+        self.channels: Union[ChannelPool, None] = None
         self.current = ''
-        self.sound_durations = {
-            'points': 153,
-            'lines': 103,
-            'triangles': 84 - 5,
+        # seconds cut from the end of a soundtrack, its level finishes that much earlier
+        self.end_trims = {
+            'triangles': 5,
         }
         for i in self.config.keys():
             self.config[i] = os.path.abspath(os.path.join(ASSETS, 'sounds', self.config[i]))
@@ -140,10 +208,14 @@ class SoundManager:
             self.init = Globals.get(MUSIC_INIT)
         else:
             self.init = False
-        self._time = time.time()
-        self._paused_timer = time.time()
+        self._time = now()
+        self._paused_timer = now()
         self._paused = False
         self.current_sound = ''
+        self.envelope = None  # precomputed envelope of the playing soundtrack, see envelopes.py
+        self.sync = AudioSync()
+        if self.init:
+            sound_cache.preload(self.config)
 
     def update_init(self):
         init = Globals.get(MUSIC_INIT)
@@ -151,32 +223,44 @@ class SoundManager:
             self.init = Globals.get(MUSIC_INIT)
 
     def update_time(self):
-        Globals.set(ELAPSED_TIME_FOR_SOUNDTRACK, self.elapsed_time)
+        if self.current_sound and not self._paused:
+            self._time -= self.sync.update(self.elapsed_time, now())
+        elapsed = self.elapsed_time
+        Globals.set(ELAPSED_TIME_FOR_SOUNDTRACK, elapsed)
+        if self.envelope is not None:
+            rms, onset, beat = self.envelope.at(elapsed)
+            Globals.set(SOUND_VALUE, rms * 10)
+            Globals.set(SOUND_ONSET, onset)
+            Globals.set(SOUND_BEAT, beat)
 
     def play_sound(self, sound):
         # for playing a single sound effect
         if not self.init:
             return
-        for i in range(8):
-            if not pygame.mixer.Channel(i).get_busy():
-                self.current = sound
-                pygame.mixer.Channel(i).play(pygame.mixer.Sound(self.config[sound]))
-                # pygame.mixer.Channel(i).set_volume(0)
-                return
-        if sound == self.current and pygame.mixer.music.get_busy():
-            return
+        if self.channels is None:
+            self.channels = ChannelPool(limits=self.limits)
         self.current = sound
-        # pygame.mixer.music.play()
+        self.channels.play(sound, sound_cache.get(sound))
+
+    def stats(self):
+        channels = self.channels
+        return {
+            'cache_hits': sound_cache.hits,
+            'decode_time_saved': sound_cache.decode_time_saved,
+            'played': channels.played if channels else 0,
+            'dropped': channels.dropped if channels else 0,
+            'stolen': channels.stolen if channels else 0,
+        }
 
     def pause(self):
         pygame.mixer.music.pause()
-        self._paused_timer = time.time()
+        self._paused_timer = now()
         self._paused = True
 
     def resume(self):
         pygame.mixer.music.unpause()
-        print(time.time() - self._paused_timer)
-        self._time += time.time() - self._paused_timer
+        print(now() - self._paused_timer)
+        self._time += now() - self._paused_timer
         self._paused = False
 
     def toggle_pause(self):
@@ -186,11 +270,18 @@ class SoundManager:
         else:
             self.resume()
 
-    @staticmethod
-    def stop():
+    def stop(self):
         pygame.mixer.music.stop()
         pygame.mixer.music.unload()
+        if self.sync.samples:
+            profiler.log(f'audio sync {self.current_sound}', self.sync.stats())
+        self.sync.reset()
+        self.current_sound = ''
+        self.envelope = None
         Globals.set(ELAPSED_TIME_FOR_SOUNDTRACK, 0)
+        Globals.set(SOUND_VALUE, 0)
+        Globals.set(SOUND_ONSET, 0)
+        Globals.set(SOUND_BEAT, 0)
 
     @staticmethod
     def fade(fade_ms=1):
@@ -203,20 +294,42 @@ class SoundManager:
         # for playing a bgm track
         self.current_sound = sound
         pygame.mixer.music.load(os.path.join(ASSETS, 'sounds', f'{sound}.ogg'))
-        duration = self.sound_durations.get(sound)
-        Globals.set(TOTAL_DURATION_OF_SOUNDTRACK, duration if duration else 0)
-        pygame.mixer.music.play(start=start)
-        self._time = time.time()
+        Globals.set(TOTAL_DURATION_OF_SOUNDTRACK, self.get_duration(sound))
+        self.envelope = load_envelope(sound)
+        start = self.start_music(start)
+        self._time = now()
         self._time -= start
 
+    def start_music(self, start):
+        # plays the loaded track from start, returns the position it really started at
+        try:
+            pygame.mixer.music.play(start=start)
+        except pygame.error as e:
+            # seeking is not supported for every format / backend, the level then runs from the top
+            print(f'could not start {self.current_sound} at {start}s ({e}), playing from the start')
+            pygame.mixer.music.play()
+            start = 0
+        if not pygame.mixer.music.get_busy():
+            print(f'{self.current_sound} did not start playing')
+        self.sync.reset(start)
+        return start
+
+    def get_duration(self, sound):
+        # exact length from the beat grid cache (see beatgrid.py), decoding the track is the slow fallback
+        duration = track_duration(sound)
+        if duration is None:
+            print(f'no beat grid for {sound}, decoding it for its length')
+            duration = pygame.mixer.Sound(os.path.join(ASSETS, 'sounds', f'{sound}.ogg')).get_length()
+        return max(duration - self.end_trims.get(sound, 0), 0)
+
     def skip_to(self, _time):
         if _time < 0:
             _time = 0
         print(_time, '[[[[[[[[[[[[[[[[[')
         pygame.mixer.music.stop()
-        pygame.mixer.music.play(start=_time)
+        _time = self.start_music(_time)
         # pygame.mixer.music.set_pos(_time)
-        self._time = time.time()
+        self._time = now()
         self._time -= _time
 
     @property
@@ -226,6 +339,6 @@ class SoundManager:
     @property
     def elapsed_time(self):
         if not self._paused:
-            return time.time() - self._time
+            return now() - self._time
         else:
             return self._paused_timer - self._time
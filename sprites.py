@@ -0,0 +1,99 @@
+"""
+Pre-rendered bullet sprites
+Each (shape, size, color, angle) variant is drawn once to an alpha surface and then only blitted,
+ObjectManager.draw sends runs of sprites to Surface.blits in one call
+"""
+
+import math
+from collections import OrderedDict
+
+import pygame
+
+from utils import get_triangle
+
+
+class SpriteCache:
+    """
+    Bounded LRU cache of bullet sprites, angles are quantized to angle_step degrees unless get() asks for a finer step
+    get() returns (surface, offset), blit the surface at position - offset
+    """
+
+    def __init__(self, max_size=2048, angle_step=1.0):
+        self.max_size = max_size
+        self.angle_step = angle_step
+        self.sprites: OrderedDict[tuple, tuple[pygame.Surface, tuple[int, int]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def clear(self):
+        self.sprites.clear()
+
+    def quantize(self, angle, step=None):
+        step = step or self.angle_step
+        return round(angle / step) % round(360 / step)
+
+    def line_step(self, length):
+        # angle step keeping the far end of a line within half a pixel of its exact angle,
+        # angle_step divided evenly so whole degree angles stay exact
+        return self.angle_step / max(1, math.ceil(math.radians(self.angle_step) * length))
+
+    def get(self, shape, size, color, angle=0.0, angle_step=None):
+        step = angle_step or self.angle_step
+        key = (shape, size, color, self.quantize(angle, step) if shape != 'point' else 0, step)
+        try:
+            sprite = self.sprites[key]
+        except KeyError:
+            self.misses += 1
+            sprite = self.sprites[key] = getattr(self, f'render_{shape}')(size, color, key[3] * step)
+            if len(self.sprites) > self.max_size:
+                self.sprites.popitem(last=False)
+                self.evictions += 1
+            return sprite
+        self.hits += 1
+        self.sprites.move_to_end(key)
+        return sprite
+
+    @staticmethod
+    def render_point(r, color, angle):
+        # white disc with a colored ring, as PointBullet.draw
+        surf = pygame.Surface((r * 2, r * 2), pygame.SRCALPHA)
+        pygame.draw.circle(surf, 'white', (r, r), r)
+        pygame.draw.circle(surf, color, (r, r), r, 2 if r > 3 else 1)
+        return surf, (r, r)
+
+    @staticmethod
+    def render_line(length, color, angle):
+        # 5px colored line under a 2px white one, starting at the offset and pointing at angle
+        dx = math.cos(math.radians(angle)) * length
+        dy = math.sin(math.radians(angle)) * length
+        pad = 3
+        ox = pad + max(0, math.ceil(-dx))
+        oy = pad + max(0, math.ceil(-dy))
+        surf = pygame.Surface((math.ceil(abs(dx)) + pad * 2 + 1, math.ceil(abs(dy)) + pad * 2 + 1), pygame.SRCALPHA)
+        pygame.draw.line(surf, color, (ox, oy), (ox + dx, oy + dy), 5)
+        pygame.draw.line(surf, 'white', (ox, oy), (ox + dx, oy + dy), 2)
+        return surf, (ox, oy)
+
+    @staticmethod
+    def render_triangle(length, color, angle):
+        # white triangle with a 2px colored outline, as TriangleBullet1.draw
+        c = length + 2
+        surf = pygame.Surface((c * 2, c * 2), pygame.SRCALPHA)
+        points = get_triangle(length, (c, c), angle)
+        pygame.draw.polygon(surf, 'white', points)
+        pygame.draw.polygon(surf, color, points, width=2)
+        return surf, (c, c)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self.sprites),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
+
+
+sprite_cache = SpriteCache()
@@ -1,17 +1,24 @@
+from collections import deque
+
 import pygame
-from utils import Timer, text
+from glyphs import glyph_atlas
+from utils import Timer
 from config import WIDTH, HEIGHT
 from typing import Union
 
 
 class Subtitle:
+    typed = True  # fully shown, see TypedSubtitle
+
     def __init__(self, name, time=None, size=35, pos=(WIDTH // 2, HEIGHT // 2), color='white', callback=None):
         self.timer = Timer(time if time and type(time) != str else max(len(name) * 0.25, 0))
         self._time = time
         self.done = False
         self.pos = pos
         self.callback = callback
-        self.text = text(name, size, color)
+        self.name = name
+        self.size = size
+        self.color = color
 
     def update(self):
         if self.timer.tick:
@@ -20,28 +27,80 @@ class Subtitle:
                 if self.callback is not None:
                     self.callback()
 
+    @property
+    def rect(self):
+        return glyph_atlas.rect(self.name, self.size, center=self.pos)
+
+    def draw(self, surf: pygame.Surface):
+        glyph_atlas.draw(surf, self.name, self.size, self.color, center=self.pos)
+
+
+class TypedSubtitle(Subtitle):
+    """
+    Subtitle typed out one character every `delay` seconds, then shown for `time` seconds
+    Newly revealed glyphs are drawn once into a surface of the whole line, so nothing is allocated while typing
+    """
+
+    def __init__(self, name, time=2, size=35, pos=(WIDTH // 2, HEIGHT // 2), color='white', callback=None, delay=0.05):
+        super().__init__(name, time, size, pos, color, callback)
+        self.delay = delay
+        self.glyphs, self.left, right = glyph_atlas.layout(name, size)
+        self.surface = pygame.Surface(glyph_atlas.size(name, size), pygame.SRCALPHA)
+        self.drawn = 0  # glyphs already drawn to the surface
+        self.revealed = 0  # characters of name shown
+        self.area = pygame.Rect(0, 0, 0, self.surface.get_height())  # part of the surface shown
+        self.called = False
+        self.reveal(1)
+
+    @property
+    def typed(self):
+        return self.revealed >= len(self.name)
+
+    def reveal(self, count):
+        count = min(count, len(self.name))
+        if count <= self.revealed:
+            return
+        self.revealed = count
+        pens, left, right = glyph_atlas.layout(self.name[:count], self.size)
+        for char, pen in self.glyphs[self.drawn:len(pens)]:
+            if char != ' ':
+                self.surface.blit(glyph_atlas.glyph(char, self.size, self.color), (pen - self.left, 0))
+        self.drawn = len(pens)
+        self.area.update(left - self.left, 0, right - left, self.surface.get_height())
+
+    def update(self):
+        elapsed = self.timer.elapsed
+        self.reveal(1 + int(elapsed / self.delay))
+        if not self.typed:
+            return
+        if not self.called:
+            self.called = True
+            if self.callback is not None:
+                self.callback()
+        if self._time != 'inf' and elapsed > (len(self.name) - 1) * self.delay + self.timer.timeout:
+            self.done = True
+
+    @property
+    def rect(self):
+        return self.area.move_to(center=self.pos)
+
     def draw(self, surf: pygame.Surface):
-        surf.blit(self.text, self.text.get_rect(center=self.pos))
+        surf.blit(self.surface, self.rect, self.area)
 
 
 def get_typed_subtitles(_text, _time=2, pos=None, callback=None):
     if pos is None:
         pos = (WIDTH // 2, HEIGHT // 2)
-    subtitles = []
-    for i in range(1, len(_text) - 2):
-        subtitles.append(Subtitle(_text[0:i], 0.05, pos=pos))
-    subtitles.append(Subtitle(_text[0:-1], 0.05, pos=pos, callback=callback))
-    subtitles.append(Subtitle(_text, _time, pos=pos))
-    return subtitles
+    return [TypedSubtitle(_text, _time, pos=pos, callback=callback)]
 
 
 class SubtitleManager:
     def __init__(self):
-        self.subtitles = [
+        self.subtitles: deque[Subtitle] = deque([
             # Subtitle('yo', 1),
             # Subtitle('wassup', 1),
             # *get_typed_subtitles('this is a typed text')
-        ]
+        ])
         self.current_subtitle: Union[Subtitle, None] = None
 
     def clear(self):
@@ -58,7 +117,7 @@ class SubtitleManager:
                 if self.current_subtitle.done:
                     self.current_subtitle = None
                     try:
-                        self.current_subtitle = self.subtitles.pop(0)
+                        self.current_subtitle = self.subtitles.popleft()
                         self.current_subtitle.timer.reset()
                     except IndexError:
                         pass
@@ -66,11 +125,15 @@ class SubtitleManager:
                 print(e)
         else:
             try:
-                self.current_subtitle = self.subtitles.pop(0)
+                self.current_subtitle = self.subtitles.popleft()
                 self.current_subtitle.timer.reset()
             except IndexError:
                 pass
 
+    def idle(self):
+        # nothing queued and nothing being typed
+        return not self.subtitles and (self.current_subtitle is None or self.current_subtitle.typed)
+
     def draw(self, surf: pygame.Surface):
         if self.current_subtitle:
             self.current_subtitle.draw(surf)
@@ -0,0 +1,65 @@
+"""
+bench.clip_segments against Rect.clipline, which it has to answer exactly like
+"""
+
+import numpy
+import pygame
+import pytest
+
+from bench import clip_segments
+
+
+def clipline(rect, segments):
+    return [bool(rect.clipline(*i)) for i in numpy.asarray(segments, dtype=float).tolist()]
+
+
+def random_rect(rng):
+    # zero and negative sizes included, clipline flips negative ones and never hits empty ones
+    return pygame.Rect(*rng.integers(-50, 250, 2).tolist(), *rng.integers(-4, 60, 2).tolist())
+
+
+def random_segments(rng, rect, n=400):
+    # around the rect at a few scales, with integer, axis aligned, degenerate and mirrored ones mixed in
+    scale = rng.choice([2, 10, 50, 400, 5000])
+    segments = rng.uniform(-scale, scale, (n, 4)) + numpy.array([rect.centerx, rect.centery] * 2)
+    k = n // 8
+    segments[:k] = numpy.round(segments[:k])
+    segments[k:2 * k, 3] = segments[k:2 * k, 1]
+    segments[2 * k:3 * k, 2] = segments[2 * k:3 * k, 0]
+    segments[3 * k:4 * k, 2:] = segments[3 * k:4 * k, :2]
+    segments[4 * k:5 * k] = -segments[4 * k:5 * k]
+    # endpoints exactly on the edges and corners
+    edges = numpy.array([rect.left, rect.right - 1, rect.left - 1, rect.right])
+    segments[5 * k:6 * k, 0::2] = rng.choice(edges, (k, 2))
+    edges = numpy.array([rect.top, rect.bottom - 1, rect.top - 1, rect.bottom])
+    segments[5 * k:6 * k, 1::2] = rng.choice(edges, (k, 2))
+    return segments
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_random_segments(seed):
+    rng = numpy.random.default_rng(seed)
+    rect = random_rect(rng)
+    segments = random_segments(rng, rect)
+    assert clip_segments(segments, rect).tolist() == clipline(rect, segments)
+
+
+@pytest.mark.parametrize('rect', [(0, 0, 0, 10), (0, 0, 10, 0), (5, 5, -3, 4), (5, 5, 4, -3), (5, 5, -1, -1)])
+def test_empty_and_negative_rects(rect):
+    rect = pygame.Rect(rect)
+    segments = [(-20, -20, 20, 20), (3, 3, 3, 3), (4, 0, 4, 10), (0, 4, 10, 4), (2.9, 2.9, 6.5, 6.5)]
+    assert clip_segments(segments, rect).tolist() == clipline(rect, segments)
+
+
+def test_truncation_towards_zero():
+    # -0.5 truncates to 0 like pygame does, floor would give -1 and miss
+    rect = pygame.Rect(0, 0, 10, 10)
+    segments = [(-0.5, -0.5, -0.5, -5), (10.9, 5, 20, 5), (9.9, 5, 20, 5), (-0.9, -20, -0.9, 20)]
+    assert clip_segments(segments, rect).tolist() == clipline(rect, segments)
+
+
+def test_shapes():
+    rect = pygame.Rect(0, 0, 10, 10)
+    assert clip_segments([], rect).tolist() == []
+    assert clip_segments((1, 1, 2, 2), rect).tolist() == [True]
+    assert clip_segments(numpy.array([[20, 20, 30, 30]]), rect).tolist() == [False]
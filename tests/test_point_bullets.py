@@ -0,0 +1,77 @@
+"""
+PointBulletPool against PointBullet objects, the reference it replaces
+"""
+
+import random
+from types import SimpleNamespace
+
+import pygame
+import pytest
+
+from config import WIDTH, HEIGHT
+from objects import PointBullet, PointBulletPool
+
+
+def random_bullet(rng):
+    # from anywhere on (or just off) the screen, at the speeds and sizes the point level uses
+    angle = rng.uniform(0, 6.3)
+    speed = rng.choice([0.5, 1, 1.5, 3])
+    return (rng.uniform(-10, WIDTH + 10), rng.uniform(-10, HEIGHT + 10),
+            pygame.Vector2(speed, 0).rotate_rad(angle).x, pygame.Vector2(speed, 0).rotate_rad(angle).y,
+            rng.choice([3, 5, 8]))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_pool_matches_point_bullets(seed):
+    rng = random.Random(seed)
+    pool = PointBulletPool()
+    bullets = []
+    hits = 0
+    for frame in range(200):
+        # spawned bullets only take part from the next frame, like ObjectManager._to_add
+        pool.flush()
+        bullets = [i for i in bullets if i.alive]
+        for _ in range(rng.randrange(4)):
+            x, y, dx, dy, r = random_bullet(rng)
+            pool.spawn(x, y, dx, dy, r)
+            bullets.append(PointBullet(x, y, dx, dy, r))
+        live = bullets[:len(pool)]
+        assert pool.x[:len(pool)].tolist() == [i.x for i in live]
+        assert pool.y[:len(pool)].tolist() == [i.y for i in live]
+
+        # half of the time right next to a bullet, so hits and near misses both come up
+        if live and rng.random() < 0.5:
+            near = rng.choice(live)
+            pos = near.x + rng.uniform(-20, 5), near.y + rng.uniform(-20, 5)
+        else:
+            pos = rng.randrange(WIDTH), rng.randrange(HEIGHT)
+        player = SimpleNamespace(rect=pygame.Rect(*pos, 15, 15))
+        hit = pool.check_collision(player)
+        assert hit == any(i.check_collision(player) for i in live)
+        hits += hit
+        pool.update([])
+        for i in live:
+            i.update([])
+        assert pool.alive[:len(pool)].tolist() == [i.alive for i in live]
+    assert hits
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_pool_sprites_match_draw_circle(seed):
+    # sprites blitted by the pool look exactly like PointBullet.draw, also across the screen edges
+    rng = random.Random(seed)
+    pool = PointBulletPool()
+    bullets = []
+    for _ in range(40):
+        x = rng.choice([rng.uniform(-10, 10), rng.uniform(0, WIDTH), rng.uniform(WIDTH - 10, WIDTH + 10)])
+        y = rng.choice([rng.uniform(-10, 10), rng.uniform(0, HEIGHT), rng.uniform(HEIGHT - 10, HEIGHT + 10)])
+        r = rng.choice([3, 5, 8])
+        pool.spawn(x, y, 0, 0, r)
+        bullets.append(PointBullet(x, y, 0, 0, r))
+    pool.flush()
+    expected = pygame.Surface((WIDTH, HEIGHT))
+    for i in bullets:
+        i.draw(expected)
+    drawn = pygame.Surface((WIDTH, HEIGHT))
+    pool.draw(drawn)
+    assert pygame.image.tobytes(drawn, 'RGB') == pygame.image.tobytes(expected, 'RGB')
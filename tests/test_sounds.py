@@ -0,0 +1,95 @@
+"""
+Sound effect cache and the sound statistics the reports show
+"""
+
+import os
+import threading
+
+import pygame
+import pytest
+
+from config import ASSETS, Globals
+from constants import MUSIC_INIT
+from sounds import SoundCache, SoundManager
+
+PING = os.path.join(ASSETS, 'sounds', 'ping.ogg')
+
+
+@pytest.fixture(autouse=True)
+def mixer():
+    pygame.mixer.init()
+    yield
+    pygame.mixer.quit()
+
+
+def test_preload_on_a_thread():
+    cache = SoundCache()
+    cache.preload({'ping': PING})
+    cache.thread.join()
+    assert cache.get('ping') is cache.sounds['ping']
+    assert cache.hits == 1
+
+
+def test_preload_without_threads(monkeypatch):
+    # like the browser build, where starting a thread raises
+    def start(self):
+        raise RuntimeError("can't start new thread")
+
+    monkeypatch.setattr(threading.Thread, 'start', start)
+    cache = SoundCache()
+    cache.preload({'ping': PING})
+    assert cache.thread is None and not cache.threaded
+    assert not cache.sounds
+    sound = cache.get('ping')
+    assert isinstance(sound, pygame.mixer.Sound)
+    assert cache.get('ping') is sound and cache.hits == 1
+
+
+def test_profiler_overlay_shows_sound_stats(monkeypatch):
+    from profiler import Profiler
+
+    monkeypatch.setitem(Globals._config, MUSIC_INIT, True)
+    manager = SoundManager()
+    manager.play_sound('ping')
+    profiler = Profiler()
+    profiler.visible = True
+    profiler.begin_frame()
+    profiler.end_frame(sound_manager=manager)
+    assert profiler.sound['played'] == 1
+    pygame.font.init()
+    profiler.draw(pygame.Surface((400, 600)))
+
+
+def test_headless_report_shows_sound_stats(capsys):
+    from headless import report, run_level
+
+    result = run_level('point', seconds=0.5, god=True, draw=False)
+    assert result['sound'].keys() >= {'cache_hits', 'decode_time_saved', 'played', 'dropped', 'stolen'}
+    assert result['audio_sync'].keys() >= {'samples', 'error_mean', 'error_max', 'drift', 'resyncs'}
+    report(result)
+    out = capsys.readouterr().out
+    assert 'sound effects: ' in out
+    assert 'audio sync: ' in out
+
+
+@pytest.mark.parametrize('profiling', [True, False])
+def test_audio_sync_stats_logged_on_stop(monkeypatch, capsys, profiling):
+    from profiler import profiler
+
+    monkeypatch.setattr(profiler, 'visible', profiling)
+    monkeypatch.setattr(profiler, 'logs', [])
+    manager = SoundManager()
+    manager.current_sound = 'points'
+    # as left by AudioSync.update after a few mixer samples
+    manager.sync.samples = 4
+    manager.sync.error_sum = 0.04
+    manager.sync.error_max = 0.02
+    manager.sync.resyncs = 1
+    manager.stop()
+    if profiling:
+        assert profiler.logs == [{'frame': profiler.frame_index, 'name': 'audio sync points', 'samples': 4,
+                                  'error_mean': 0.01, 'error_max': 0.02, 'drift': 0.0, 'resyncs': 1}]
+        assert 'audio sync points: samples 4' in capsys.readouterr().out
+    else:
+        assert profiler.logs == []
+    assert manager.sync.samples == 0
@@ -0,0 +1,257 @@
+"""
+Precompiled bullet pattern timelines
+The enemy pattern tables (Enemy.get_launching_patterns and Enemy.get_enemy_launch_patterns)
+are compiled into flat, time sorted numpy arrays under assets/timelines
+so a level start is a single file read instead of rebuilding every table
+
+usage:
+    python timeline.py build [level ...]       regenerate the compiled timelines
+    python timeline.py validate [level ...]    check them against the in-code definitions
+"""
+
+import argparse
+import hashlib
+import inspect
+import math
+import os
+import sys
+from functools import lru_cache
+from operator import itemgetter
+
+import numpy
+
+from config import ASSETS, WIDTH, HEIGHT
+
+VERSION = 1
+TIMELINES = os.path.join(ASSETS, 'timelines')
+LEVELS = {
+    'point': 'PointEnemy',
+    'line': 'LineEnemy',
+    'triangle': 'TriangleEnemy',
+}
+# launch kinds, 'angles' means a list of launch angles in degrees
+KINDS = ('angles', 'all', 'move', 'line_ray', 'rotate', 'rotate faster')
+
+
+def timeline_path(name):
+    return os.path.join(TIMELINES, f'{name}.npz')
+
+
+@lru_cache()
+def timeline_source_hash(enemy):
+    # fingerprint of the in-code definitions a timeline was compiled from
+    # None when the source is not available (frozen builds), compiled files are trusted then
+    try:
+        source = inspect.getsource(enemy.get_launching_patterns) + inspect.getsource(enemy.get_enemy_launch_patterns)
+    except (OSError, TypeError):
+        return None
+    return hashlib.sha1(f'{VERSION} {WIDTH} {HEIGHT}\n{source}'.encode()).hexdigest()
+
+
+class Timeline:
+    """
+    Compiled launch and spawn tables of one enemy
+    launch table -> time, kind, bullet, speed, angles (angle_offsets into angles), jitter group
+    spawn table -> time, type, sources relative to the enemy and targets (spawn_offsets into both)
+    """
+
+    def __init__(self, arrays: dict):
+        self.arrays = arrays
+
+    @property
+    def source_hash(self):
+        return str(self.arrays['source_hash'])
+
+    def __len__(self):
+        return len(self.arrays['time'])
+
+    def launching_patterns(self, classes: dict):
+        a = self.arrays
+        names = a['classes'].tolist()
+        typed = bool(a['typed'])
+        offsets = a['angle_offsets'].tolist()
+        angles = a['angles'].tolist()
+        patterns = []
+        for i, (t, kind, bullet, speed, group, jitter) in enumerate(zip(
+                a['time'].tolist(), a['kind'].tolist(), a['bullet'].tolist(),
+                a['speed'].tolist(), a['group'].tolist(), a['jitter'].tolist())):
+            what = angles[offsets[i]:offsets[i + 1]] if KINDS[kind] == 'angles' else KINDS[kind]
+            if typed:
+                pattern = [t, classes[names[bullet]] if bullet >= 0 else None, what]
+            else:
+                pattern = [t, what]
+            if not math.isnan(speed):
+                pattern.append(speed)
+            if not math.isnan(group):
+                pattern += [group, jitter]
+            patterns.append(pattern)
+        return patterns
+
+    def enemy_launch_patterns(self, classes: dict, pos):
+        a = self.arrays
+        names = a['classes'].tolist()
+        offsets = a['spawn_offsets'].tolist()
+        sources = a['spawn_sources'].tolist()
+        targets = a['spawn_targets'].tolist()
+        x, y = pos
+        patterns = []
+        for i, (t, _type) in enumerate(zip(a['spawn_time'].tolist(), a['spawn_type'].tolist())):
+            s = slice(offsets[i], offsets[i + 1])
+            patterns.append([
+                t,
+                classes[names[_type]],
+                [(x + dx, y + dy) for dx, dy in sources[s]],
+                [tuple(j) for j in targets[s]]
+            ])
+        return patterns
+
+
+def compile_timeline(enemy) -> dict:
+    # flattens the in-code definitions of an Enemy subclass into numpy arrays
+    launches = sorted(enemy.get_launching_patterns(), key=itemgetter(0))
+    # spawn sources are stored relative to the enemy position
+    spawns = sorted(enemy.get_enemy_launch_patterns((0, 0)), key=itemgetter(0))
+    typed = bool(launches) and (launches[0][1] is None or isinstance(launches[0][1], type))
+    classes = []
+
+    def class_index(cls):
+        if cls is None:
+            return -1
+        if cls.__name__ not in classes:
+            classes.append(cls.__name__)
+        return classes.index(cls.__name__)
+
+    time, kind, bullet, speed, group, jitter = [], [], [], [], [], []
+    angle_offsets, angles = [0], []
+    for pattern in launches:
+        if typed:
+            _, cls, what, *extra = pattern
+        else:
+            _, what, *extra = pattern
+            cls = None
+        time.append(pattern[0])
+        bullet.append(class_index(cls))
+        if isinstance(what, str):
+            kind.append(KINDS.index(what))
+        else:
+            kind.append(0)
+            angles.extend(what)
+        angle_offsets.append(len(angles))
+        speed.append(extra[0] if len(extra) > 0 else math.nan)
+        group.append(extra[1] if len(extra) > 2 else math.nan)
+        jitter.append(extra[2] if len(extra) > 2 else 0)
+
+    spawn_time, spawn_type, spawn_offsets, sources, targets = [], [], [0], [], []
+    for pattern in spawns:
+        spawn_time.append(pattern[0])
+        spawn_type.append(class_index(pattern[1]))
+        sources.extend(pattern[2])
+        targets.extend(pattern[3])
+        spawn_offsets.append(len(sources))
+
+    return {
+        'version': numpy.array(VERSION, dtype=numpy.int32),
+        'source_hash': numpy.array(timeline_source_hash(enemy) or ''),
+        'classes': numpy.array(classes, dtype=str),
+        'typed': numpy.array(typed),
+        'time': numpy.array(time, dtype=numpy.float64),
+        'kind': numpy.array(kind, dtype=numpy.int8),
+        'bullet': numpy.array(bullet, dtype=numpy.int16),
+        'speed': numpy.array(speed, dtype=numpy.float64),
+        'group': numpy.array(group, dtype=numpy.float64),
+        'jitter': numpy.array(jitter, dtype=numpy.int32),
+        'angle_offsets': numpy.array(angle_offsets, dtype=numpy.int32),
+        'angles': numpy.array(angles, dtype=numpy.float64),
+        'spawn_time': numpy.array(spawn_time, dtype=numpy.float64),
+        'spawn_type': numpy.array(spawn_type, dtype=numpy.int16),
+        'spawn_offsets': numpy.array(spawn_offsets, dtype=numpy.int32),
+        'spawn_sources': numpy.array(sources, dtype=numpy.float64).reshape(-1, 2),
+        'spawn_targets': numpy.array(targets, dtype=numpy.float64).reshape(-1, 2),
+    }
+
+
+def save_timeline(name, arrays: dict):
+    os.makedirs(TIMELINES, exist_ok=True)
+    numpy.savez(timeline_path(name), **arrays)
+
+
+def read_timeline(name):
+    path = timeline_path(name)
+    if not os.path.exists(path):
+        return None
+    try:
+        with numpy.load(path, allow_pickle=False) as data:
+            arrays = {i: data[i] for i in data.files}
+    except (OSError, ValueError) as e:
+        print(f'could not read timeline {path}: {e}')
+        return None
+    if int(arrays.get('version', -1)) != VERSION:
+        return None
+    return arrays
+
+
+@lru_cache()
+def load_timeline(name):
+    arrays = read_timeline(name)
+    return Timeline(arrays) if arrays is not None else None
+
+
+def compare(expected: dict, actual: dict):
+    # names of the arrays that differ
+    errors = []
+    for key in sorted(set(expected) | set(actual)):
+        if key not in expected or key not in actual:
+            errors.append(key)
+            continue
+        a, b = expected[key], actual[key]
+        if a.shape != b.shape or a.dtype.kind != b.dtype.kind:
+            errors.append(key)
+        elif a.dtype.kind == 'f':
+            if not numpy.array_equal(a, b, equal_nan=True):
+                errors.append(key)
+        elif not numpy.array_equal(a, b):
+            errors.append(key)
+    return errors
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='compile and check the enemy pattern timelines')
+    parser.add_argument('command', choices=('build', 'validate'))
+    parser.add_argument('levels', nargs='*', default=list(LEVELS))
+    args = parser.parse_args(argv)
+
+    import objects
+
+    failed = False
+    for name in args.levels:
+        enemy = getattr(objects, LEVELS[name])
+        arrays = compile_timeline(enemy)
+        if args.command == 'build':
+            save_timeline(name, arrays)
+            print(f'{name}: {len(arrays["time"])} launches, {len(arrays["spawn_time"])} spawns -> {timeline_path(name)}')
+            continue
+        stored = read_timeline(name)
+        if stored is None:
+            print(f'{name}: missing or unreadable {timeline_path(name)}')
+            failed = True
+            continue
+        errors = compare(arrays, stored)
+        # decoding the file and compiling it again must give the same arrays back
+        timeline = Timeline(stored)
+        decoded = type('Decoded', (), {
+            'get_launching_patterns': staticmethod(lambda: timeline.launching_patterns(vars(objects))),
+            'get_enemy_launch_patterns': staticmethod(lambda pos: timeline.enemy_launch_patterns(vars(objects), pos)),
+        })
+        round_trip = compile_timeline(decoded)
+        round_trip['source_hash'] = stored['source_hash']
+        errors += [f'{i} (round trip)' for i in compare(stored, round_trip)]
+        if errors:
+            failed = True
+            print(f'{name}: out of date, differs in {", ".join(errors)}')
+        else:
+            print(f'{name}: ok')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
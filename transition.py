@@ -1,3 +1,6 @@
+import math
+
+import numpy
 import pygame
 
 from config import WIDTH, HEIGHT
@@ -36,6 +39,11 @@ class Transition:
         else:
             return 'unknown'
 
+    @property
+    def visible(self):
+        # whether draw() changes anything on screen
+        return self.get_size() > 0
+
     def start(self):
         self.k = self.multiplier
 
@@ -49,64 +57,82 @@ class Transition:
         surf.blit(self.surf, (0, 0))
 
 
-class SquareTransition(Transition):
-    def __init__(self):
+class GridTransition(Transition):
+    """
+    Transition made of a grid of growing / shrinking cells
+    Cell sizes live in a numpy array, every cell size is rendered once into a sprite atlas
+    and the whole grid is drawn with a single blits call
+    """
+
+    def __init__(self, size, multiplier, dtype):
         super().__init__()
-        self.size = 75
-        self.multiplier = 5
-        self.squares = [
-            [0 for _ in range(WIDTH // self.size + 1)] for _ in range(HEIGHT // self.size + 1)
-        ]
+        self.size = size
+        self.multiplier = multiplier
+        self.grid = numpy.zeros((HEIGHT // self.size + 1, WIDTH // self.size + 1), dtype=dtype)
+        self.centers = [self.cell_center(row, col) for row in range(self.grid.shape[0]) for col in range(self.grid.shape[1])]
+        self.atlas: dict[float, tuple[pygame.Surface, tuple[int, int]]] = {}
+
+    def cell_center(self, row, col) -> tuple[int, int]:
+        raise NotImplementedError('cell_center method not implemented yet')
+
+    def render_cell(self, size) -> tuple[pygame.Surface, tuple[int, int]]:
+        # sprite of one cell and the offset of the cell center inside it
+        raise NotImplementedError('render_cell method not implemented yet')
 
     def get_size(self) -> int:
-        return self.squares[0][0]
+        return self.grid[0, 0].item()
 
     def update(self):
-        for row in range(len(self.squares)):
-            for col in range(len(self.squares[row])):
-                self.squares[row][col] += self.k
-                # print(self.k)
-                if self.squares[row][col] > self.size:
-                    self.squares[row][col] = self.size
-                if self.squares[row][col] < 0:
-                    self.squares[row][col] = 0
+        if self.k:
+            numpy.clip(self.grid + self.k, 0, self.size, out=self.grid, casting='unsafe')
+
+    def get_sprite(self, size):
+        try:
+            return self.atlas[size]
+        except KeyError:
+            sprite = self.atlas[size] = self.render_cell(size)
+            return sprite
 
     def draw(self, surf: pygame.Surface):
-        for row in range(len(self.squares)):
-            for col in range(len(self.squares[row])):
-                size = self.squares[row][col]
-                # print(size, self.squares)
-                pygame.draw.rect(surf, 'black', (col * self.size + self.size // 2 - size // 2, row * self.size + self.size // 2 - size // 2, size, size))
-                pygame.draw.rect(surf, 'white', (col * self.size + self.size // 2 - size // 2, row * self.size + self.size // 2 - size // 2, size, size), 2)
+        if not self.grid.any():
+            # fully open, nothing to draw
+            return
+        blits = []
+        for (x, y), size in zip(self.centers, self.grid.ravel().tolist()):
+            if size:
+                sprite, (ox, oy) = self.get_sprite(size)
+                blits.append((sprite, (x - ox, y - oy)))
+        surf.blits(blits, doreturn=False)
+
+
+class SquareTransition(GridTransition):
+    def __init__(self):
+        super().__init__(75, 5, numpy.int32)
 
+    def cell_center(self, row, col):
+        return col * self.size + self.size // 2, row * self.size + self.size // 2
 
-class CircleTransition(Transition):
-    def __init__(self):
-        super().__init__()
-        self.size = 50
-        self.multiplier = 2.5
-        self.circles = [
-            [0 for _ in range(WIDTH // self.size + 1)] for _ in range(HEIGHT // self.size + 1)
-        ]
+    def render_cell(self, size):
+        sprite = pygame.Surface((size, size), pygame.SRCALPHA)
+        pygame.draw.rect(sprite, 'black', (0, 0, size, size))
+        pygame.draw.rect(sprite, 'white', (0, 0, size, size), 2)
+        return sprite, (size // 2, size // 2)
 
-    def get_size(self) -> int:
-        return self.circles[0][0]
 
-    def update(self):
-        for row in range(len(self.circles)):
-            for col in range(len(self.circles[row])):
-                self.circles[row][col] += self.k
-                if self.circles[row][col] > self.size:
-                    self.circles[row][col] = self.size
-                if self.circles[row][col] < 0:
-                    self.circles[row][col] = 0
+class CircleTransition(GridTransition):
+    def __init__(self):
+        super().__init__(50, 2.5, numpy.float64)
 
-    def draw(self, surf: pygame.Surface):
-        for row in range(len(self.circles)):
-            for col in range(len(self.circles[row])):
-                size = self.circles[row][col]
-                pygame.draw.circle(surf, 'black', (col * self.size, row * self.size), size * 0.55)
-                pygame.draw.circle(surf, 'white', (col * self.size, row * self.size), size * 0.55, 2)
+    def cell_center(self, row, col):
+        return col * self.size, row * self.size
+
+    def render_cell(self, size):
+        r = size * 0.55
+        c = math.ceil(r) + 1
+        sprite = pygame.Surface((c * 2, c * 2), pygame.SRCALPHA)
+        pygame.draw.circle(sprite, 'black', (c, c), r)
+        pygame.draw.circle(sprite, 'white', (c, c), r, 2)
+        return sprite, (c, c)
 
 
 class FadeTransition(Transition):
@@ -126,7 +152,8 @@ class FadeTransition(Transition):
         self.surf.set_alpha(self.alpha)
 
     def draw(self, surf: pygame.Surface):
-        surf.blit(self.surf, (0, 0))
+        if self.alpha > 0:
+            surf.blit(self.surf, (0, 0))
 
 
 class TransitionManager:
@@ -1,10 +1,13 @@
 import math
 import os
 import time
+from bisect import bisect_left
 from config import ASSETS
 from functools import lru_cache
+from operator import itemgetter
 from typing import Literal
 
+import numpy
 import pygame
 # import pygame.gfxdraw
 
@@ -14,6 +17,120 @@ FONT = os.path.abspath(os.path.join(ASSETS, 'fonts', 'font.ttf'))
 # FONT = 'consolas'
 
 
+class GameClock:
+    """
+    Game time in seconds, sampled once per frame from a monotonic source
+    Every Timer, Subtitle and the sound manager read it through now(),
+    so pausing or scaling it affects all of them at once
+    """
+
+    def __init__(self, source=time.perf_counter):
+        self.source = source
+        self.last = source()
+        self.time = 0.0
+        self.dt = 0.0
+        self.scale = 1.0
+        self.paused = False
+
+    @property
+    def realtime(self):
+        # running on the wall clock at normal speed
+        return self.source is time.perf_counter and self.scale == 1 and not self.paused
+
+    def set_source(self, source=None):
+        # e.g. a simulated clock for headless runs, None restores perf_counter
+        self.source = source if source is not None else time.perf_counter
+        self.last = self.source()
+
+    def tick(self):
+        # called once at the start of every frame
+        t = self.source()
+        self.dt = 0.0 if self.paused else (t - self.last) * self.scale
+        self.last = t
+        self.time += self.dt
+        return self.dt
+
+    def step(self, dt):
+        # advances by a fixed amount instead of sampling the source, see FrameScheduler
+        self.last = self.source()
+        self.dt = 0.0 if self.paused else dt * self.scale
+        self.time += self.dt
+        return self.dt
+
+    def pause(self):
+        self.paused = True
+
+    def resume(self):
+        self.paused = False
+
+
+game_clock = GameClock()
+
+
+class FrameScheduler:
+    """
+    Fixed timestep pacing for the game loop
+    Real time is collected in an accumulator and paid out in whole update steps,
+    rendering happens once per loop no matter how many steps ran
+    """
+
+    def __init__(self, fps=60, max_steps=10, idle_fps=15):
+        self.step = 1 / fps
+        self.fps = fps
+        self.max_steps = max_steps  # spiral of death guard
+        self.idle_fps = idle_fps
+        self.accumulator = 0.0
+        self.last = time.perf_counter()
+        self.dropped = 0.0  # real time the simulation skipped instead of catching up
+
+    def reset(self):
+        self.accumulator = 0.0
+        self.last = time.perf_counter()
+
+    def advance(self) -> int:
+        # number of update steps to run this loop
+        t = time.perf_counter()
+        self.accumulator += t - self.last
+        self.last = t
+        # a quarter step of slack, a loop capped at exactly fps would otherwise alternate between 0 and 2 steps
+        steps = int(self.accumulator / self.step + 0.25)
+        if steps > self.max_steps:
+            # too far behind to catch up, skip the backlog but still move the game clock over it
+            # so soundtrack time (and the patterns timed against it) does not fall behind the music
+            skipped = (steps - self.max_steps) * self.step
+            game_clock.step(skipped)
+            self.dropped += skipped
+            self.accumulator -= skipped
+            steps = self.max_steps
+        self.accumulator -= steps * self.step
+        return steps
+
+    def get_fps(self, idle=False):
+        # frame rate to cap the loop at
+        return self.idle_fps if idle else self.fps
+
+
+_key_state = None
+
+
+def now():
+    """Current game time in seconds, constant within a frame"""
+    return game_clock.time
+
+
+def get_pressed():
+    """Keyboard state, pygame.key.get_pressed() unless overridden with set_key_state"""
+    if _key_state is not None:
+        return _key_state
+    return pygame.key.get_pressed()
+
+
+def set_key_state(state=None):
+    """Override the keyboard state with anything indexable by key code (None restores pygame)"""
+    global _key_state
+    _key_state = state
+
+
 def clamp(value, mini, maxi):
     """Clamp value between mini and maxi"""
     if value < mini:
@@ -92,16 +209,30 @@ def get_triangle1(length=50, pos=(150, 150), angle=45):
     return points
 
 
+TRIANGLE_STEPS = 1440  # angles per turn in the triangle table, 0.25 degrees apart
+
+
+@lru_cache()
+def triangle_table():
+    # the unit vertex (0, -1) rotated by every quantized angle, then by 120 and 240 more -> TRIANGLE_STEPS x 3 x 2
+    angles = numpy.radians(numpy.arange(TRIANGLE_STEPS)[:, None] * (360 / TRIANGLE_STEPS) + numpy.array((0, 120, 240)))
+    return numpy.stack([numpy.sin(angles), -numpy.cos(angles)], axis=2)
+
+
+def triangle_shape(length, angle):
+    # vertices around the centre as (ax, ay, bx, by, cx, cy), objects with a fixed angle keep it
+    row = triangle_table()[round(angle * TRIANGLE_STEPS / 360) % TRIANGLE_STEPS]
+    return tuple((row * length).ravel().tolist())
+
+
+def translate_triangle(shape, pos):
+    x, y = pos
+    ax, ay, bx, by, cx, cy = shape
+    return [(x + ax, y + ay), (x + bx, y + by), (x + cx, y + cy)]
+
+
 def get_triangle(length, pos, angle):
-    pos = pygame.Vector2(pos)
-    point_a = pygame.Vector2(0, -length)
-    point_b = point_a.rotate(120)
-    point_c = point_a.rotate(240)
-    points = [point_a, point_b, point_c]
-    for i in points:
-        i.rotate_ip(angle)
-        i += pos
-    return points
+    return translate_triangle(triangle_shape(length, angle), pos)
 
 
 def draw_triangle(surf: pygame.Surface, pos=(150, 150), color=(255, 255, 255), angle=45, length=50, width=0):
@@ -116,33 +247,33 @@ def draw_triangle(surf: pygame.Surface, pos=(150, 150), color=(255, 255, 255), a
 class Timer:
     def __init__(self, timeout=0.0, callback=None):
         self.timeout = timeout
-        self.timer = time.time()
-        self.paused_timer = time.time()
+        self.timer = now()
+        self.paused_timer = now()
         self.paused = False
         self.callback_done = False
         self.callable = callback
 
     def reset(self):
-        self.timer = time.time()
+        self.timer = now()
 
     def pause(self):
         self.paused = True
-        self.paused_timer = time.time()
+        self.paused_timer = now()
 
     def resume(self):
         self.paused = False
-        self.timer -= time.time() - self.paused_timer
+        self.timer -= now() - self.paused_timer
 
     @property
     def elapsed(self):
         if self.paused:
-            return time.time() - self.timer - (time.time() - self.paused_timer)
-        return time.time() - self.timer
+            return self.paused_timer - self.timer
+        return now() - self.timer
 
     @property
     def tick(self):
         if self.elapsed > self.timeout:
-            self.timer = time.time()  # reset timer
+            self.timer = now()  # reset timer
             if self.callable is not None:
                 self.callable()
             return True
@@ -175,6 +306,40 @@ class TimerSequence:
             return 'none'
 
 
+class PatternSchedule:
+    """
+    Launch patterns sorted once by time and walked with a bisect cursor
+    """
+
+    def __init__(self, entries):
+        # entries -> list [ list [ float (time), ... ] ]
+        self.entries = sorted(entries, key=itemgetter(0))
+        self.times = [i[0] for i in self.entries]
+        self.cursor = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def seek(self, _time):
+        # everything scheduled before _time counts as already launched
+        self.cursor = bisect_left(self.times, _time)
+
+    def due(self, elapsed):
+        # all entries with time < elapsed that were not returned yet, in time order
+        if elapsed is None:
+            return []
+        end = bisect_left(self.times, elapsed, self.cursor)
+        if end == self.cursor:
+            return []
+        batch = self.entries[self.cursor:end]
+        self.cursor = end
+        return batch
+
+    @property
+    def done(self):
+        return self.cursor >= len(self.entries)
+
+
 class SpriteSheet:
     """
     Class to load sprite-sheets